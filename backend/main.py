@@ -1,20 +1,85 @@
 from __future__ import annotations
 
+import hashlib
+import json
 import logging
+import time
+from contextlib import asynccontextmanager
+from datetime import date, timedelta
+from typing import List, Literal, Optional
 
-from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi import Depends, FastAPI, File, Header, HTTPException, Query, Request, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
-from .models import GradeRequest, GradeResponse, RecognitionResponse
+from .models import (
+    BulkIngestError,
+    BulkIngestResponse,
+    GradeQuestionRequest,
+    GradeRequest,
+    GradeResponse,
+    ProfileSummary,
+    ProfilingSettingsModel,
+    RecognitionJobStatus,
+    RecognitionJobSubmitted,
+    RecognitionResponse,
+    ScoreBreakdown,
+    SearchHitModel,
+    SearchResponse,
+    TrackerDashboard,
+)
+from .services.answer_key import AnswerKeyStore
 from .services.grading import SympyGrader
+from .services.ingest import AttemptIngestor
+from .services.jobs import RecognitionJobQueue
 from .services.ocr import OCRPipeline
+from .services.profiling import (
+    ProfileStore,
+    ProfilingMiddleware,
+    ProfilingSettings,
+    annotate,
+    is_admin,
+    to_thread,
+)
+from .services.rollups import RollupService
+from .services.search import QuestionSearch
+from .services.tracker import TrackerRepository
+from .services.tracker_db import TrackerDatabase
 
 LOGGER = logging.getLogger(__name__)
 
+ocr_pipeline = OCRPipeline()
+grader = SympyGrader()
+answer_keys = AnswerKeyStore(grader)
+recognition_jobs = RecognitionJobQueue(ocr_pipeline)
+question_search = QuestionSearch()
+profiling_settings = ProfilingSettings()
+profile_store = ProfileStore()
+tracker_db = TrackerDatabase.from_env()
+rollups = RollupService(tracker_db) if tracker_db else None
+attempt_ingestor = AttemptIngestor(TrackerRepository(tracker_db, rollups)) if tracker_db else None
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    answer_keys.load()
+    question_search.refresh()
+    if tracker_db is not None:
+        tracker_db.ensure_schema()
+    recognition_jobs.start()
+    try:
+        yield
+    finally:
+        recognition_jobs.stop()
+        if tracker_db is not None:
+            tracker_db.close()
+
+
 app = FastAPI(
     title="SPM Add Math AI Marking API",
     version="0.1.0",
     description="Uploads handwritten answers, performs OCR + grading, and returns explanations.",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -24,9 +89,12 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(ProfilingMiddleware, settings=profiling_settings, store=profile_store)
 
-ocr_pipeline = OCRPipeline()
-grader = SympyGrader()
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token missing or invalid.")
 
 
 @app.get("/healthz")
@@ -44,16 +112,65 @@ async def recognize_answer(image: UploadFile = File(...)):
     if not contents:
         raise HTTPException(status_code=400, detail="Uploaded file is empty.")
 
-    result = await ocr_pipeline.analyze(contents)
+    annotate(image_sha256=hashlib.sha256(contents).hexdigest(), image_bytes=len(contents))
+    result = await to_thread(ocr_pipeline.recognize, contents)
     return RecognitionResponse(**result)
 
 
+@app.post(
+    "/api/recognize-answer/jobs",
+    response_model=RecognitionJobSubmitted,
+    status_code=202,
+    summary="Queue an uploaded answer image for background recognition.",
+)
+async def submit_recognition_job(
+    image: UploadFile = File(...),
+    lane: Literal["interactive", "bulk"] = Query("interactive"),
+    ttl_seconds: Optional[float] = Query(
+        None, gt=0, description="How long to keep the result after it finishes."
+    ),
+):
+    contents = await image.read()
+    if not contents:
+        raise HTTPException(status_code=400, detail="Uploaded file is empty.")
+
+    annotate(image_sha256=hashlib.sha256(contents).hexdigest(), image_bytes=len(contents))
+    job_id = await to_thread(recognition_jobs.submit, contents, lane=lane, result_ttl=ttl_seconds)
+    return RecognitionJobSubmitted(job_id=job_id, lane=lane, status="queued")
+
+
+@app.get(
+    "/api/recognize-answer/jobs/{job_id}",
+    response_model=RecognitionJobStatus,
+    summary="Poll a recognition job; pass `wait` to long-poll until it finishes.",
+)
+async def get_recognition_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=30, description="Seconds to wait for completion."),
+):
+    job = await recognition_jobs.wait(job_id, timeout=wait)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired job '{job_id}'.")
+
+    return RecognitionJobStatus(
+        job_id=job.job_id,
+        lane=job.lane,
+        status=job.status,
+        result=RecognitionResponse(**job.result) if job.result else None,
+        error=job.error,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+    )
+
+
 @app.post(
     "/api/grade-answer",
     response_model=GradeResponse,
     summary="Compare the confirmed LaTeX against the official answer.",
 )
 async def grade_answer(payload: GradeRequest):
+    annotate(student_latex=payload.student_latex, answer_latex=payload.answer_latex)
     correct, normalized, reason = grader.grade(
         payload.student_latex, payload.answer_latex
     )
@@ -64,3 +181,185 @@ async def grade_answer(payload: GradeRequest):
         normalized_answer=normalized.answer,
     )
 
+
+@app.post(
+    "/api/grade-question",
+    response_model=GradeResponse,
+    summary="Grade the confirmed LaTeX against the stored answer key for a question.",
+)
+async def grade_question(payload: GradeQuestionRequest):
+    annotate(question_id=payload.question_id, student_latex=payload.student_latex)
+    key = answer_keys.get(payload.question_id)
+    if key is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No answer key for question '{payload.question_id}'.",
+        )
+
+    correct, normalized, reason = grader.grade_compiled(
+        payload.student_latex, key.compiled
+    )
+    return GradeResponse(
+        correct=correct,
+        reason=reason,
+        normalized_student=normalized.student,
+        normalized_answer=normalized.answer,
+    )
+
+
+@app.get(
+    "/api/search",
+    response_model=SearchResponse,
+    summary="Typo-tolerant search over question OCR text (English or Malay).",
+)
+async def search_questions(
+    q: str = Query(..., min_length=1, description="Search terms."),
+    limit: int = Query(10, ge=1, le=100),
+    min_score: float = Query(0.3, ge=0.0, le=1.0),
+):
+    annotate(query=q)
+    started = time.perf_counter()
+    hits = question_search.search(q, limit=limit, min_score=min_score)
+    took_ms = (time.perf_counter() - started) * 1000
+    return SearchResponse(
+        query=q,
+        hits=[
+            SearchHitModel(question_id=hit.question_id, score=hit.score, snippet=hit.snippet)
+            for hit in hits
+        ],
+        took_ms=round(took_ms, 3),
+    )
+
+
+@app.get(
+    "/admin/profiling",
+    response_model=ProfilingSettingsModel,
+    dependencies=[Depends(require_admin)],
+    summary="Show the current profiling settings.",
+)
+async def get_profiling_settings():
+    return ProfilingSettingsModel(
+        slow_ms=profiling_settings.slow_ms, interval_ms=profiling_settings.interval_ms
+    )
+
+
+@app.put(
+    "/admin/profiling",
+    response_model=ProfilingSettingsModel,
+    dependencies=[Depends(require_admin)],
+    summary="Turn automatic slow-request profiling on/off and tune the sampling rate.",
+)
+async def update_profiling_settings(payload: ProfilingSettingsModel):
+    profiling_settings.slow_ms = payload.slow_ms
+    profiling_settings.interval_ms = payload.interval_ms
+    return payload
+
+
+@app.get(
+    "/admin/profiles",
+    response_model=List[ProfileSummary],
+    dependencies=[Depends(require_admin)],
+    summary="List captured request profiles, newest first.",
+)
+async def list_profiles():
+    return await to_thread(profile_store.list)
+
+
+@app.get(
+    "/admin/profiles/{profile_id}",
+    dependencies=[Depends(require_admin)],
+    summary="Download a profile as JSON, or as folded stacks for flamegraph tools.",
+)
+async def download_profile(
+    profile_id: str, format: Literal["json", "folded"] = Query("json")
+):
+    profile = await to_thread(profile_store.get, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Unknown profile '{profile_id}'.")
+
+    if format == "folded":
+        return PlainTextResponse(
+            profile["folded"],
+            headers={"Content-Disposition": f'attachment; filename="{profile_id}.folded"'},
+        )
+    return profile
+
+
+@app.get(
+    "/api/tracker/dashboard/{user_id}",
+    response_model=TrackerDashboard,
+    summary="Dashboard aggregates served from the tracker rollup tables.",
+)
+async def tracker_dashboard(
+    user_id: str,
+    days: int = Query(7, ge=1, le=365, description="Length of the recent window."),
+    min_questions: int = Query(3, ge=1, description="Minimum answered questions for a weak link."),
+):
+    if rollups is None:
+        raise HTTPException(status_code=503, detail="DATABASE_URL is not configured.")
+
+    since = (date.today() - timedelta(days=days - 1)).isoformat()
+
+    def breakdown(items):
+        return [
+            ScoreBreakdown(
+                chapter=item.chapter,
+                subtopic=item.subtopic,
+                cognitive=item.cognitive,
+                score=item.score,
+                max_score=item.max_score,
+                percent=item.percent,
+                questions=item.questions,
+            )
+            for item in items
+        ]
+
+    def load() -> TrackerDashboard:
+        rollups.ensure_fresh(user_id)
+        return TrackerDashboard(
+            user_id=user_id,
+            since=since,
+            chapters=breakdown(rollups.chapter_scores(user_id)),
+            cognitive=breakdown(rollups.cognitive_scores(user_id)),
+            recent_subtopics=breakdown(rollups.subtopic_scores(user_id, since=since)),
+            weak_links=breakdown(
+                rollups.subtopic_scores(
+                    user_id, since=since, min_questions=min_questions, weakest=3
+                )
+            ),
+        )
+
+    # The rollup reads (and a possible per-user rebuild) use blocking drivers.
+    return await to_thread(load)
+
+
+@app.post(
+    "/api/tracker/attempts/bulk",
+    response_model=BulkIngestResponse,
+    summary="Bulk upsert of tracker attempts from JSON or long-format CSV.",
+)
+async def bulk_ingest_attempts(request: Request):
+    if attempt_ingestor is None:
+        raise HTTPException(status_code=503, detail="DATABASE_URL is not configured.")
+
+    body = await request.body()
+    content_type = request.headers.get("content-type", "")
+    annotate(content_type=content_type, bytes=len(body))
+    try:
+        if "csv" in content_type:
+            report = await to_thread(attempt_ingestor.ingest_csv, body.decode("utf-8-sig"))
+        else:
+            payload = json.loads(body or b"null")
+            report = await to_thread(attempt_ingestor.ingest_json, payload)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    return BulkIngestResponse(
+        attempts=report.attempts,
+        questions=report.questions,
+        rejected_attempts=report.rejected_attempts,
+        errors=[BulkIngestError(row=e.row, error=e.error) for e in report.errors],
+        result_ids=report.result_ids,
+        seconds=round(report.seconds, 4),
+        rows_per_sec=round(report.rows_per_sec, 1),
+    )
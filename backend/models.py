@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Literal, Optional
+from typing import Any, Dict, List, Literal, Optional
 
 from pydantic import BaseModel, Field
 
@@ -23,6 +23,26 @@ class RecognitionResponse(BaseModel):
     )
 
 
+class RecognitionJobSubmitted(BaseModel):
+    job_id: str = Field(..., description="Identifier used to poll for the result.")
+    lane: Literal["interactive", "bulk"] = Field(
+        ..., description="Priority lane the job was queued in."
+    )
+    status: Literal["queued", "running", "done", "failed"] = Field(
+        ..., description="Current job state."
+    )
+
+
+class RecognitionJobStatus(RecognitionJobSubmitted):
+    result: Optional[RecognitionResponse] = Field(
+        None, description="OCR output once the job has finished successfully."
+    )
+    error: Optional[str] = Field(None, description="Failure message, if any.")
+    created_at: float = Field(..., description="Submission time (Unix seconds).")
+    started_at: Optional[float] = Field(None, description="Time a worker picked it up.")
+    finished_at: Optional[float] = Field(None, description="Time the job completed.")
+
+
 class GradeRequest(BaseModel):
     student_latex: str = Field(
         ..., description="LaTeX string confirmed by the student via MathLive."
@@ -32,6 +52,15 @@ class GradeRequest(BaseModel):
     )
 
 
+class GradeQuestionRequest(BaseModel):
+    question_id: str = Field(
+        ..., description="Question bank ID whose server-side answer key is used."
+    )
+    student_latex: str = Field(
+        ..., description="LaTeX string confirmed by the student via MathLive."
+    )
+
+
 class GradeResponse(BaseModel):
     correct: bool = Field(
         ..., description="Whether the normalized SymPy expressions are equivalent."
@@ -44,3 +73,78 @@ class GradeResponse(BaseModel):
         None, description="Canonicalized SymPy string for the reference answer."
     )
 
+
+class SearchHitModel(BaseModel):
+    question_id: str = Field(..., description="Question bank ID, e.g. AM_Kedah_2025_P1_Q01.")
+    score: float = Field(
+        ..., ge=0.0, le=1.0, description="Fuzzy match score; 1 means every term matched exactly."
+    )
+    snippet: str = Field(..., description="OCR text around the first matching term.")
+
+
+class SearchResponse(BaseModel):
+    query: str
+    hits: List[SearchHitModel]
+    took_ms: float = Field(..., description="Time spent querying the index.")
+
+
+class ProfilingSettingsModel(BaseModel):
+    slow_ms: float = Field(
+        ..., ge=0.0, description="Save a profile for any request slower than this (0 disables)."
+    )
+    interval_ms: float = Field(
+        ..., ge=1.0, le=1000.0, description="Sampling interval of the profiler."
+    )
+
+
+class ProfileSummary(BaseModel):
+    id: str
+    method: Optional[str] = None
+    path: Optional[str] = None
+    status: Optional[int] = None
+    trigger: Literal["header", "slow"]
+    started_at: float
+    duration_ms: float
+    interval_ms: float
+    samples: int
+    input: Dict[str, Any] = Field(
+        default_factory=dict, description="Request inputs, e.g. image hash or LaTeX pair."
+    )
+
+
+class ScoreBreakdown(BaseModel):
+    chapter: Optional[str] = None
+    subtopic: Optional[str] = None
+    cognitive: Optional[str] = None
+    score: float = Field(..., description="Sum of marks obtained.")
+    max_score: float = Field(..., description="Sum of full marks for the answered questions.")
+    percent: Optional[float] = Field(None, description="score / max_score as a percentage.")
+    questions: int = Field(..., description="Number of answered questions aggregated.")
+
+
+class TrackerDashboard(BaseModel):
+    user_id: str
+    since: str = Field(..., description="Start of the recent window (inclusive).")
+    chapters: List[ScoreBreakdown] = Field(..., description="All-time score per chapter.")
+    cognitive: List[ScoreBreakdown] = Field(..., description="All-time score per cognitive level.")
+    recent_subtopics: List[ScoreBreakdown] = Field(
+        ..., description="Score per subtopic within the recent window."
+    )
+    weak_links: List[ScoreBreakdown] = Field(
+        ..., description="Lowest-scoring recent subtopics with enough answered questions."
+    )
+
+
+class BulkIngestError(BaseModel):
+    row: int = Field(..., description="CSV line number, or index of the attempt in a JSON list.")
+    error: str
+
+
+class BulkIngestResponse(BaseModel):
+    attempts: int = Field(..., description="Attempts written (inserted or updated).")
+    questions: int = Field(..., description="Question rows written.")
+    rejected_attempts: int = Field(..., description="Attempts skipped because a row was invalid.")
+    errors: List[BulkIngestError]
+    result_ids: List[str] = Field(..., description="result_id of each written attempt, in input order.")
+    seconds: float
+    rows_per_sec: float = Field(..., description="(attempts + questions) written per second.")
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import pickle
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .grading import SympyGrader
+
+LOGGER = logging.getLogger(__name__)
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+ANSWER_KEY_PATH = Path(
+    os.getenv("AI_MARKING_ANSWER_KEYS", str(REPO_ROOT / "data" / "answer-keys.json"))
+)
+ANSWER_KEY_CACHE = Path(
+    os.getenv(
+        "AI_MARKING_ANSWER_KEY_CACHE",
+        str(REPO_ROOT / "backend" / ".cache" / "answer-keys.pkl"),
+    )
+)
+QUESTIONS_PATH = REPO_ROOT / "data" / "questions.json"
+
+# Bump whenever the pickled layout or the normalization rules change.
+CACHE_VERSION = 1
+
+
+@dataclass
+class AnswerKey:
+    question_id: str
+    answer_latex: str
+    alternatives: List[str] = field(default_factory=list)
+    # Normalized SymPy expressions: official answer first, then alternatives.
+    compiled: List[object] = field(default_factory=list)
+
+
+class AnswerKeyStore:
+    """
+    Server-side answer keys keyed by question ID (e.g. `AM_Kedah_2025_P1_Q01`).
+
+    Every reference answer is parsed and simplified once, then pickled next to the
+    backend so restarts only pay for unpickling. The cache is invalidated whenever
+    the source JSON or the SymPy version changes. Answers that fail to compile are
+    left out of the cache, so they are retried on the next start.
+    """
+
+    def __init__(
+        self,
+        grader: SympyGrader,
+        source_path: Path = ANSWER_KEY_PATH,
+        cache_path: Path = ANSWER_KEY_CACHE,
+    ) -> None:
+        self.grader = grader
+        self.source_path = Path(source_path)
+        self.cache_path = Path(cache_path)
+        self._keys: Dict[str, AnswerKey] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def get(self, question_id: str) -> Optional[AnswerKey]:
+        return self._keys.get(question_id)
+
+    def load(self) -> None:
+        if not self.source_path.exists():
+            LOGGER.info("No answer keys found at %s.", self.source_path)
+            self._keys = {}
+            return
+
+        raw = self.source_path.read_bytes()
+        # Pickled expressions are only valid for the SymPy version that built them.
+        digest = hashlib.sha256(raw + _sympy_version().encode("utf-8")).hexdigest()
+
+        payload = json.loads(raw.decode("utf-8"))
+        cached = self._read_cache(digest) or {}
+        missing = {question_id: entry for question_id, entry in payload.items() if question_id not in cached}
+        compiled = self._compile(missing) if missing else {}
+        self._keys = {
+            question_id: cached[question_id] if question_id in cached else compiled[question_id]
+            for question_id in payload
+        }
+        if compiled:
+            self._write_cache(digest)
+        LOGGER.info("Loaded %d precompiled and compiled %d answer keys.", len(cached), len(compiled))
+
+    def _compile(self, payload: dict) -> Dict[str, AnswerKey]:
+        known_ids = _load_question_ids()
+        keys: Dict[str, AnswerKey] = {}
+
+        for question_id, entry in payload.items():
+            if known_ids and question_id not in known_ids:
+                LOGGER.warning("Answer key %s does not match any question.", question_id)
+
+            if isinstance(entry, str):
+                entry = {"answer_latex": entry}
+            key = AnswerKey(
+                question_id=question_id,
+                answer_latex=entry["answer_latex"],
+                alternatives=list(entry.get("alternatives", [])),
+            )
+
+            if self.grader.available:
+                for latex in [key.answer_latex, *key.alternatives]:
+                    try:
+                        key.compiled.append(self.grader.compile_answer(latex))
+                    except Exception as exc:
+                        LOGGER.warning("Unable to compile %s (%r): %s", question_id, latex, exc)
+                        key.compiled.append(None)
+
+            keys[question_id] = key
+        return keys
+
+    def _read_cache(self, digest: str) -> Optional[Dict[str, AnswerKey]]:
+        if not self.grader.available or not self.cache_path.exists():
+            return None
+        try:
+            with self.cache_path.open("rb") as handle:
+                cached = pickle.load(handle)
+        except Exception as exc:
+            LOGGER.warning("Ignoring unreadable answer-key cache: %s", exc)
+            return None
+
+        if cached.get("version") != CACHE_VERSION or cached.get("digest") != digest:
+            return None
+        return cached["keys"]
+
+    def _write_cache(self, digest: str) -> None:
+        if not self.grader.available:
+            return
+        complete = {
+            question_id: key for question_id, key in self._keys.items() if None not in key.compiled
+        }
+        if len(complete) < len(self._keys):
+            LOGGER.warning("Not caching %d answer keys that failed to compile.", len(self._keys) - len(complete))
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.cache_path.with_suffix(".tmp")
+            with tmp_path.open("wb") as handle:
+                pickle.dump(
+                    {"version": CACHE_VERSION, "digest": digest, "keys": complete},
+                    handle,
+                    protocol=pickle.HIGHEST_PROTOCOL,
+                )
+            tmp_path.replace(self.cache_path)
+        except Exception as exc:  # pragma: no cover - cache is best-effort
+            LOGGER.warning("Unable to write answer-key cache: %s", exc)
+
+
+def _sympy_version() -> str:
+    try:
+        import sympy
+
+        return sympy.__version__
+    except Exception:  # pragma: no cover - optional dependency
+        return ""
+
+
+def _load_question_ids() -> set:
+    try:
+        with QUESTIONS_PATH.open("r", encoding="utf-8") as handle:
+            return {item["id"] for item in json.load(handle)}
+    except Exception:
+        return set()
+
+
+def main() -> None:
+    """Precompiles the answer keys at build time, e.g. inside the Docker image."""
+    ap = argparse.ArgumentParser(description="Precompile answer keys into the SymPy cache.")
+    ap.add_argument("--source", type=Path, default=ANSWER_KEY_PATH)
+    ap.add_argument("--cache", type=Path, default=ANSWER_KEY_CACHE)
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    store = AnswerKeyStore(SympyGrader(), source_path=args.source, cache_path=args.cache)
+    store.load()
+
+
+if __name__ == "__main__":
+    main()
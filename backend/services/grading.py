@@ -2,17 +2,18 @@ from __future__ import annotations
 
 import logging
 from dataclasses import dataclass
-from typing import Optional, Tuple
+from typing import Optional, Sequence, Tuple
 
 LOGGER = logging.getLogger(__name__)
 
 try:  # SymPy is an optional dependency for the web app, so import lazily.
     import sympy as sp
-    from sympy.parsing.latex import parse_latex
+    from sympy.parsing.latex import LaTeXParsingError, parse_latex
 except Exception as exc:  # pragma: no cover - optional dependency
     LOGGER.warning("SymPy unavailable, grading will return mocked values: %s", exc)
     sp = None  # type: ignore
     parse_latex = None  # type: ignore
+    LaTeXParsingError = Exception  # type: ignore
 
 
 @dataclass
@@ -55,31 +56,61 @@ class SympyGrader:
             answer=self._serialize(answer_expr),
         )
 
+    def compile_answer(self, latex: str):
+        """
+        Normalizes a reference answer once so it can be cached and reused by
+        `grade_compiled` (see `AnswerKeyStore`).
+        """
+        return self._normalize_expr(latex)
+
     def grade(self, student_latex: str, answer_latex: str) -> Tuple[bool, NormalizedPair, str]:
         if not self.available:
-            reason = (
-                "SymPy is not installed. Install sympy to enable structural grading."
-            )
-            normalized = NormalizedPair(student=None, answer=None)
-            return False, normalized, reason
+            return self._unavailable()
 
-        student_expr = self._normalize_expr(student_latex)
-        answer_expr = self._normalize_expr(answer_latex)
+        answer_expr = self._parse_or_none(answer_latex)
+        return self.grade_compiled(student_latex, [answer_expr])
+
+    def _parse_or_none(self, latex: str):
+        # Malformed LaTeX (e.g. an unclosed `\frac{`) grades as unparseable instead of failing.
+        try:
+            return self._normalize_expr(latex)
+        except (LaTeXParsingError, sp.SympifyError) as exc:
+            LOGGER.debug("Unable to parse %r: %s", latex, exc)
+            return None
+
+    def grade_compiled(
+        self, student_latex: str, answer_exprs: Sequence
+    ) -> Tuple[bool, NormalizedPair, str]:
+        """
+        Grades against already-normalized reference expressions. The first entry is
+        the official answer; any others are accepted alternative forms.
+        """
+        if not self.available:
+            return self._unavailable()
+
+        student_expr = self._parse_or_none(student_latex)
+        # An official answer that failed to compile still leaves its alternatives.
+        candidates = [(index, expr) for index, expr in enumerate(answer_exprs) if expr is not None]
 
         normalized = NormalizedPair(
             student=self._serialize(student_expr),
-            answer=self._serialize(answer_expr),
+            answer=self._serialize(candidates[0][1]) if candidates else None,
         )
 
-        if student_expr is None or answer_expr is None:
+        if student_expr is None or not candidates:
             return False, normalized, "Unable to parse one of the expressions."
 
-        difference = sp.simplify(student_expr - answer_expr)
-        equivalent = difference == 0
+        for index, candidate in candidates:
+            if sp.simplify(student_expr - candidate) == 0:
+                if index == 0:
+                    reason = "Normalized expressions are symbolically identical."
+                else:
+                    reason = "Matches an accepted alternative form of the answer."
+                    normalized.answer = self._serialize(candidate)
+                return True, normalized, reason
 
-        if equivalent:
-            reason = "Normalized expressions are symbolically identical."
-        else:
-            reason = "Expressions differ after SymPy simplification."
+        return False, normalized, "Expressions differ after SymPy simplification."
 
-        return equivalent, normalized, reason
+    def _unavailable(self) -> Tuple[bool, NormalizedPair, str]:
+        reason = "SymPy is not installed. Install sympy to enable structural grading."
+        return False, NormalizedPair(student=None, answer=None), reason
@@ -0,0 +1,288 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .tracker import Attempt, ResultQuestion, TrackerRepository
+from .tracker_db import TrackerDatabase
+
+LOGGER = logging.getLogger(__name__)
+
+INGEST_BATCH = int(os.getenv("AI_MARKING_INGEST_BATCH", "500"))
+PAPER_CODES = ("P1", "P2")
+
+# Long format: one row per question, attempt fields repeated on every row.
+CSV_COLUMNS = (
+    "user_id",
+    "state",
+    "year",
+    "paper_no",
+    "date_done",
+    "time_spent_min",
+    "notes",
+    "q_no",
+    "section",
+    "max_score",
+    "score",
+    "chapter",
+    "subtopic",
+    "cognitive",
+)
+ATTEMPT_FIELDS = ("date_done", "time_spent_min", "notes")
+
+
+@dataclass
+class IngestError:
+    row: int
+    error: str
+
+
+@dataclass
+class IngestReport:
+    attempts: int = 0
+    questions: int = 0
+    rejected_attempts: int = 0
+    errors: List[IngestError] = field(default_factory=list)
+    result_ids: List[str] = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def rows_per_sec(self) -> float:
+        return (self.attempts + self.questions) / self.seconds if self.seconds else 0.0
+
+
+def rows_from_json(payload) -> Tuple[List[dict], List[int]]:
+    """
+    Flattens `[{...attempt, by_question: [...]}, ...]` (or `{"attempts": [...]}`),
+    the shape used by the Next.js tracker, into question rows. Errors refer to
+    the attempt's position in the list.
+    """
+    if isinstance(payload, dict):
+        payload = payload.get("attempts")
+    if not isinstance(payload, list):
+        raise ValueError("Expected a list of attempts or {\"attempts\": [...]}.")
+
+    rows, sources = [], []
+    for index, attempt in enumerate(payload):
+        if not isinstance(attempt, dict):
+            rows.append({})
+            sources.append(index)
+            continue
+        base = {name: attempt.get(name) for name in CSV_COLUMNS[:7]}
+        questions = attempt.get("by_question") or [{}]
+        for question in questions:
+            rows.append({**base, **(question if isinstance(question, dict) else {})})
+            sources.append(index)
+    return rows, sources
+
+
+def rows_from_csv(text: str) -> Tuple[List[dict], List[int]]:
+    """Reads long-format CSV; errors refer to the line number in the file."""
+    reader = csv.DictReader(io.StringIO(text))
+    missing = {"user_id", "state", "year", "paper_no", "date_done", "q_no", "max_score"} - set(
+        reader.fieldnames or ()
+    )
+    if missing:
+        raise ValueError(f"CSV is missing columns: {', '.join(sorted(missing))}")
+    rows = list(reader)
+    return rows, list(range(2, len(rows) + 2))
+
+
+def validate(rows: Sequence[dict], sources: Sequence[int]) -> Tuple[List[Attempt], List[IngestError], int]:
+    """
+    Checks every row with array operations, then groups rows into attempts.
+    An attempt with any invalid row is rejected as a whole; the rest are kept.
+    Scores are clamped to [0, max_score] like the Next.js API does. Returns
+    (valid attempts, errors, number of rejected attempts).
+    """
+    n = len(rows)
+    if n == 0:
+        return [], [], 0
+    column = {name: np.array([_text(row.get(name)) for row in rows], dtype=object) for name in CSV_COLUMNS}
+    year = _numbers(column["year"])
+    q_no = _numbers(column["q_no"])
+    max_score = _numbers(column["max_score"])
+    score = _numbers(column["score"])
+    time_spent = _numbers(column["time_spent_min"])
+    dates = np.frompyfunc(_iso_date, 1, 1)(column["date_done"]).astype(object)
+
+    problems = [
+        (column["user_id"] == "", "user_id is required"),
+        (column["state"] == "", "state is required"),
+        (~np.isin(column["paper_no"], PAPER_CODES), f"paper_no must be one of {', '.join(PAPER_CODES)}"),
+        (~_is_int(year) | (year < 1900), "year must be a four-digit integer"),
+        (dates == None, "date_done must be an ISO date (YYYY-MM-DD)"),  # noqa: E711
+        (~_is_int(q_no) | (q_no < 1), "q_no must be a positive integer"),
+        (~(max_score > 0), "max_score must be a positive number"),
+        ((column["score"] != "") & np.isnan(score), "score must be a number or empty"),
+        (
+            (column["time_spent_min"] != "") & (~_is_int(time_spent) | (time_spent < 0)),
+            "time_spent_min must be a non-negative integer or empty",
+        ),
+    ]
+
+    key = np.array(
+        [
+            "\x1f".join((u, s, y, p))
+            for u, s, y, p in zip(column["user_id"], column["state"], column["year"], column["paper_no"])
+        ],
+        dtype=object,
+    )
+    groups, first, group_of = np.unique(key, return_index=True, return_inverse=True)
+    for name in ATTEMPT_FIELDS:
+        values = column[name]
+        problems.append((values != values[first][group_of], f"{name} differs between rows of the same attempt"))
+    question_key = np.char.add(group_of.astype(str), np.char.add(":", column["q_no"].astype(str)))
+    _, question_of, counts = np.unique(question_key, return_inverse=True, return_counts=True)
+    problems.append((counts[question_of] > 1, "q_no appears more than once in the same attempt"))
+
+    bad = np.zeros(n, dtype=bool)
+    errors: Dict[Tuple[int, str], None] = {}
+    for mask, message in problems:
+        mask = np.asarray(mask, dtype=bool)
+        bad |= mask
+        for index in np.flatnonzero(mask):
+            errors.setdefault((sources[index], message), None)
+
+    rejected = np.zeros(len(groups), dtype=bool)
+    rejected[group_of[bad]] = True
+    score = np.where(np.isnan(score), np.nan, np.clip(score, 0, max_score))
+
+    attempts: Dict[int, Attempt] = {}
+    for index in np.argsort(group_of, kind="stable"):
+        group = group_of[index]
+        if rejected[group]:
+            continue
+        attempt = attempts.get(group)
+        if attempt is None:
+            attempt = attempts[group] = Attempt(
+                user_id=column["user_id"][index],
+                state=column["state"][index],
+                year=int(year[index]),
+                paper_no=column["paper_no"][index],
+                date_done=dates[index],
+                time_spent_min=None if np.isnan(time_spent[index]) else int(time_spent[index]),
+                notes=column["notes"][index] or None,
+            )
+        attempt.by_question.append(
+            ResultQuestion(
+                q_no=int(q_no[index]),
+                section=column["section"][index],
+                max_score=float(max_score[index]),
+                score=None if np.isnan(score[index]) else float(score[index]),
+                chapter=column["chapter"][index] or None,
+                subtopic=column["subtopic"][index] or None,
+                cognitive=column["cognitive"][index] or None,
+            )
+        )
+
+    ordered = [attempts[group] for group in sorted(attempts, key=lambda g: first[g])]
+    errors_out = [IngestError(row=row, error=message) for row, message in errors]
+    return ordered, errors_out, int(rejected.sum())
+
+
+class AttemptIngestor:
+    """Validates a bulk upload and writes the valid attempts in batched transactions."""
+
+    def __init__(self, repository: TrackerRepository, batch_size: int = INGEST_BATCH) -> None:
+        self.repository = repository
+        self.batch_size = batch_size
+
+    def ingest(self, rows: Sequence[dict], sources: Sequence[int]) -> IngestReport:
+        started = time.perf_counter()
+        attempts, errors, rejected = validate(rows, sources)
+        report = IngestReport(
+            attempts=len(attempts),
+            questions=sum(len(attempt.by_question) for attempt in attempts),
+            rejected_attempts=rejected,
+            errors=errors,
+        )
+        report.result_ids = self.repository.upsert_attempts(attempts, batch_size=self.batch_size)
+        report.seconds = time.perf_counter() - started
+        LOGGER.info(
+            "Ingested %d attempts / %d questions in %.2fs (%.0f rows/s), %d errors.",
+            report.attempts,
+            report.questions,
+            report.seconds,
+            report.rows_per_sec,
+            len(errors),
+        )
+        return report
+
+    def ingest_json(self, payload) -> IngestReport:
+        return self.ingest(*rows_from_json(payload))
+
+    def ingest_csv(self, text: str) -> IngestReport:
+        return self.ingest(*rows_from_csv(text))
+
+
+def _text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _numbers(values: np.ndarray) -> np.ndarray:
+    return np.frompyfunc(_float_or_nan, 1, 1)(values).astype(float)
+
+
+def _float_or_nan(value: str) -> float:
+    try:
+        return float(value) if value != "" else float("nan")
+    except ValueError:
+        return float("nan")
+
+
+def _is_int(values: np.ndarray) -> np.ndarray:
+    return np.isfinite(values) & (np.mod(values, 1) == 0)
+
+
+def _iso_date(value: str) -> Optional[str]:
+    try:
+        return date.fromisoformat(value[:10]).isoformat() if value else None
+    except ValueError:
+        return None
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Bulk-load tracker attempts from JSON or CSV.")
+    ap.add_argument("path", type=Path, help="Attempts file (.json or long-format .csv)")
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    db = TrackerDatabase.from_env()
+    if db is None:
+        raise SystemExit("Set DATABASE_URL (postgres://... or sqlite:///path.db).")
+    db.ensure_schema()
+    try:
+        ingestor = AttemptIngestor(TrackerRepository(db))
+        text = args.path.read_text(encoding="utf-8")
+        if args.path.suffix.lower() == ".csv":
+            report = ingestor.ingest_csv(text)
+        else:
+            report = ingestor.ingest_json(json.loads(text))
+    finally:
+        db.close()
+    for error in report.errors[:20]:
+        print(f"[row {error.row}] {error.error}")
+    print(
+        f"[DONE] {report.attempts} attempts, {report.questions} questions, "
+        f"{report.rejected_attempts} rejected, {report.rows_per_sec:.0f} rows/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
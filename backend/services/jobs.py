@@ -0,0 +1,361 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .ocr import OCRPipeline
+
+LOGGER = logging.getLogger(__name__)
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+JOB_DB_PATH = Path(
+    os.getenv("AI_MARKING_JOB_DB", str(REPO_ROOT / "backend" / ".cache" / "jobs.sqlite3"))
+)
+JOB_WORKERS = int(os.getenv("AI_MARKING_JOB_WORKERS", "2"))
+# Workers that only ever pick up interactive jobs, so bulk marking can't starve them.
+JOB_RESERVED_INTERACTIVE = int(os.getenv("AI_MARKING_JOB_RESERVED_INTERACTIVE", "1"))
+JOB_RESULT_TTL = float(os.getenv("AI_MARKING_JOB_RESULT_TTL", "3600"))
+# A running job whose owner hasn't renewed its lease for this long is requeued.
+JOB_LEASE = float(os.getenv("AI_MARKING_JOB_LEASE", "60"))
+
+# Lower value = served first.
+LANES = {"interactive": 0, "bulk": 1}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS recognition_jobs (
+  job_id TEXT PRIMARY KEY,
+  lane TEXT NOT NULL,
+  priority INTEGER NOT NULL,
+  status TEXT NOT NULL,
+  payload BLOB,
+  result TEXT,
+  error TEXT,
+  result_ttl REAL NOT NULL,
+  created_at REAL NOT NULL,
+  started_at REAL,
+  finished_at REAL,
+  expires_at REAL,
+  worker_id TEXT,
+  lease_expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS recognition_jobs_queue
+  ON recognition_jobs (status, priority, created_at);
+CREATE INDEX IF NOT EXISTS recognition_jobs_expiry
+  ON recognition_jobs (expires_at);
+"""
+# Columns added after the first release; ALTERed into existing databases.
+_LEASE_COLUMNS = {"worker_id": "TEXT", "lease_expires_at": "REAL"}
+
+
+@dataclass
+class RecognitionJob:
+    job_id: str
+    lane: str
+    status: str
+    result: Optional[dict]
+    error: Optional[str]
+    created_at: float
+    started_at: Optional[float]
+    finished_at: Optional[float]
+
+    @property
+    def finished(self) -> bool:
+        return self.status in {"done", "failed"}
+
+
+class RecognitionJobQueue:
+    """
+    Local, SQLite-backed job queue that runs `OCRPipeline` on background threads.
+
+    Several processes may share the database (e.g. `uvicorn --workers N`). A claimed
+    job is leased to this queue's `worker_id`, and a heartbeat renews the lease
+    while the process is alive. Jobs whose lease has expired (their process
+    crashed or was stopped) are requeued. Finished jobs keep their result until
+    their TTL expires.
+
+    `submit`, `get` and `purge_expired` block on SQLite; call them from a worker
+    thread (e.g. `run_in_threadpool`), never directly on the event loop. Each
+    thread reuses its own connection.
+    """
+
+    def __init__(
+        self,
+        pipeline: OCRPipeline,
+        db_path: Path = JOB_DB_PATH,
+        workers: int = JOB_WORKERS,
+        reserved_interactive: int = JOB_RESERVED_INTERACTIVE,
+        result_ttl: float = JOB_RESULT_TTL,
+        poll_interval: float = 1.0,
+        lease: float = JOB_LEASE,
+    ) -> None:
+        self.pipeline = pipeline
+        self.db_path = Path(db_path)
+        self.workers = max(workers, 1)
+        self.reserved_interactive = min(max(reserved_interactive, 0), self.workers - 1)
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._claim_lock = threading.Lock()
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        # job_id -> events of long-polls waiting on it, set from the worker threads
+        self._waiters: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = {}
+        self._waiters_lock = threading.Lock()
+
+    def start(self) -> None:
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(_SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(recognition_jobs)")}
+            for name, kind in _LEASE_COLUMNS.items():
+                if name not in columns:
+                    conn.execute(f"ALTER TABLE recognition_jobs ADD COLUMN {name} {kind}")
+            self.requeue_expired(conn)
+
+        self._stopping.clear()
+        heartbeat = threading.Thread(
+            target=self._heartbeat_loop, name="recognition-heartbeat", daemon=True
+        )
+        heartbeat.start()
+        self._threads.append(heartbeat)
+        for index in range(self.workers):
+            lanes = ["interactive"] if index < self.reserved_interactive else list(LANES)
+            thread = threading.Thread(
+                target=self._worker_loop,
+                args=(lanes,),
+                name=f"recognition-worker-{index}",
+                daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+    def submit(
+        self, image_bytes: bytes, lane: str = "interactive", result_ttl: Optional[float] = None
+    ) -> str:
+        if lane not in LANES:
+            raise ValueError(f"Unknown lane '{lane}'. Expected one of {sorted(LANES)}.")
+
+        job_id = uuid.uuid4().hex
+        self._connection().execute(
+            "INSERT INTO recognition_jobs "
+            "(job_id, lane, priority, status, payload, result_ttl, created_at) "
+            "VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+            (
+                job_id,
+                lane,
+                LANES[lane],
+                sqlite3.Binary(image_bytes),
+                self.result_ttl if result_ttl is None else result_ttl,
+                time.time(),
+            ),
+        )
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[RecognitionJob]:
+        row = self._connection().execute(
+            "SELECT job_id, lane, status, result, error, created_at, started_at, "
+            "finished_at FROM recognition_jobs "
+            "WHERE job_id = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (job_id, time.time()),
+        ).fetchone()
+        if row is None:
+            return None
+        return RecognitionJob(
+            job_id=row[0],
+            lane=row[1],
+            status=row[2],
+            result=json.loads(row[3]) if row[3] else None,
+            error=row[4],
+            created_at=row[5],
+            started_at=row[6],
+            finished_at=row[7],
+        )
+
+    async def wait(
+        self, job_id: str, timeout: float, interval: float = 1.0
+    ) -> Optional[RecognitionJob]:
+        """
+        Long-poll helper: returns as soon as the job finishes or `timeout` elapses.
+        Workers in this process wake the caller directly; `interval` is only a
+        fallback re-check for jobs finished by another process sharing the database.
+        """
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        waiter = (loop, event)
+        with self._waiters_lock:
+            self._waiters.setdefault(job_id, []).append(waiter)
+        try:
+            deadline = time.monotonic() + timeout
+            job = await asyncio.to_thread(self.get, job_id)
+            while job is not None and not job.finished:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(event.wait(), min(remaining, interval))
+                except asyncio.TimeoutError:
+                    pass
+                job = await asyncio.to_thread(self.get, job_id)
+            return job
+        finally:
+            with self._waiters_lock:
+                waiters = self._waiters.get(job_id, [])
+                if waiter in waiters:
+                    waiters.remove(waiter)
+                if not waiters:
+                    self._waiters.pop(job_id, None)
+
+    def purge_expired(self) -> int:
+        return self._connection().execute(
+            "DELETE FROM recognition_jobs WHERE expires_at IS NOT NULL AND expires_at <= ?",
+            (time.time(),),
+        ).rowcount
+
+    def requeue_expired(self, conn: Optional[sqlite3.Connection] = None) -> int:
+        """Requeues running jobs whose lease has lapsed; jobs leased to live processes stay put."""
+        conn = conn or self._connection()
+        requeued = conn.execute(
+            "UPDATE recognition_jobs SET status = 'queued', started_at = NULL, "
+            "worker_id = NULL, lease_expires_at = NULL "
+            "WHERE status = 'running' AND (lease_expires_at IS NULL OR lease_expires_at <= ?)",
+            (time.time(),),
+        ).rowcount
+        if requeued:
+            LOGGER.info("Requeued %d interrupted recognition jobs.", requeued)
+            self._wakeup.set()
+        return requeued
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _connect(self) -> sqlite3.Connection:
+        # Each connection belongs to one thread; `stop` closes them all from its own.
+        conn = sqlite3.connect(
+            self.db_path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _claim(self, conn: sqlite3.Connection, lanes: List[str]):
+        placeholders = ",".join("?" for _ in lanes)
+        with self._claim_lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT job_id, payload FROM recognition_jobs "
+                    f"WHERE status = 'queued' AND lane IN ({placeholders}) "
+                    "ORDER BY priority, created_at LIMIT 1",
+                    lanes,
+                ).fetchone()
+                if row is not None:
+                    now = time.time()
+                    conn.execute(
+                        "UPDATE recognition_jobs SET status = 'running', started_at = ?, "
+                        "worker_id = ?, lease_expires_at = ? WHERE job_id = ?",
+                        (now, self.worker_id, now + self.lease, row[0]),
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return row
+
+    def _finish(self, conn, job_id: str, result: Optional[dict], error: Optional[str]) -> None:
+        now = time.time()
+        # Only the current lease holder may finish a job, in case it was requeued meanwhile.
+        conn.execute(
+            "UPDATE recognition_jobs SET status = ?, result = ?, error = ?, payload = NULL, "
+            "finished_at = ?, expires_at = ? + result_ttl, lease_expires_at = NULL "
+            "WHERE job_id = ? AND status = 'running' AND worker_id = ?",
+            (
+                "failed" if error else "done",
+                json.dumps(result) if result is not None else None,
+                error,
+                now,
+                now,
+                job_id,
+                self.worker_id,
+            ),
+        )
+        self._notify(job_id)
+
+    def _notify(self, job_id: str) -> None:
+        with self._waiters_lock:
+            waiters = list(self._waiters.get(job_id, ()))
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:  # the waiting loop has already closed
+                pass
+
+    def _heartbeat_loop(self) -> None:
+        conn = self._connection()
+        while not self._stopping.wait(self.lease / 3):
+            try:
+                conn.execute(
+                    "UPDATE recognition_jobs SET lease_expires_at = ? "
+                    "WHERE status = 'running' AND worker_id = ?",
+                    (time.time() + self.lease, self.worker_id),
+                )
+                self.requeue_expired(conn)
+            except sqlite3.Error:
+                LOGGER.exception("Unable to renew recognition job leases.")
+
+    def _worker_loop(self, lanes: List[str]) -> None:
+        conn = self._connection()
+        last_purge = 0.0
+        while not self._stopping.is_set():
+            if time.monotonic() - last_purge > 60:
+                last_purge = time.monotonic()
+                self.purge_expired()
+
+            row = self._claim(conn, lanes)
+            if row is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            job_id, payload = row
+            try:
+                result = self.pipeline.recognize(bytes(payload))
+            except Exception as exc:
+                LOGGER.exception("Recognition job %s failed.", job_id)
+                self._finish(conn, job_id, None, str(exc) or exc.__class__.__name__)
+            else:
+                self._finish(conn, job_id, result, None)
+
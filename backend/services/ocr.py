@@ -1,8 +1,10 @@
 from __future__ import annotations
 
+import asyncio
 import io
 import logging
 import os
+import threading
 from dataclasses import dataclass
 from typing import Optional, Tuple
 
@@ -35,10 +37,12 @@ class Pix2TextResult:
 class Pix2TextService:
     """
     Thin wrapper around Pix2Text so we can gracefully degrade when the dependency
-    is missing on the developer's machine.
+    is missing on the developer's machine. The engine isn't thread-safe, so calls
+    are serialized.
     """
 
     def __init__(self) -> None:
+        self._lock = threading.Lock()
         if not PIX2TEXT_ENABLED:
             LOGGER.info("Pix2Text disabled (set AI_MARKING_ENABLE_PIX2TEXT=1 to enable).")
             self._engine = None
@@ -59,7 +63,8 @@ class Pix2TextService:
             return Pix2TextResult(latex="1 + x", confidence=0.0)
 
         image = _load_image(image_bytes)
-        outputs = self._engine(image)  # type: ignore[misc]
+        with self._lock:
+            outputs = self._engine(image)  # type: ignore[misc]
 
         if isinstance(outputs, list) and outputs:
             best = max(outputs, key=lambda item: item.get("score", 0.0))
@@ -76,9 +81,11 @@ class Pix2TextService:
 class PaddleOCRService:
     """
     Captures alphanumeric context with PaddleOCR so students can verify the result.
+    Like Pix2Text, the engine is shared between threads and used one call at a time.
     """
 
     def __init__(self, lang: str = "en") -> None:
+        self._lock = threading.Lock()
         if not PADDLE_ENABLED:
             LOGGER.info("PaddleOCR disabled (set AI_MARKING_ENABLE_PADDLE_OCR=1 to enable).")
             self._engine = None
@@ -101,7 +108,8 @@ class PaddleOCRService:
         import numpy as np  # Local import to avoid dependency for other tasks.
 
         image = np.array(_load_image(image_bytes))
-        ocr_result = self._engine.ocr(image, cls=True)
+        with self._lock:
+            ocr_result = self._engine.ocr(image, cls=True)
 
         texts = []
         confidences = []
@@ -130,6 +138,11 @@ class OCRPipeline:
         self.text_engine = text_engine or PaddleOCRService()
 
     async def analyze(self, image_bytes: bytes) -> dict:
+        # Inference is blocking, so keep it off the event loop.
+        return await asyncio.to_thread(self.recognize, image_bytes)
+
+    def recognize(self, image_bytes: bytes) -> dict:
+        """Synchronous variant of `analyze`, for worker threads."""
         formula = self.formula_engine.extract_formula(image_bytes)
         text, text_confidence = self.text_engine.extract_text(image_bytes)
 
@@ -0,0 +1,316 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import hmac
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, TypeVar
+
+LOGGER = logging.getLogger(__name__)
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+PROFILE_DIR = Path(
+    os.getenv("AI_MARKING_PROFILE_DIR", str(REPO_ROOT / "backend" / ".cache" / "profiles"))
+)
+# Unset/0 disables automatic capture of slow requests.
+PROFILE_SLOW_MS = float(os.getenv("AI_MARKING_PROFILE_SLOW_MS", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("AI_MARKING_PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_FILES = int(os.getenv("AI_MARKING_PROFILE_MAX_FILES", "200"))
+# Admin endpoints and the per-request header are unavailable until this is set.
+ADMIN_TOKEN = os.getenv("AI_MARKING_ADMIN_TOKEN", "")
+
+PROFILE_HEADER = b"x-profile"
+ADMIN_HEADER = b"x-admin-token"
+
+_capture: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar(
+    "profile_capture", default=None
+)
+_profiler: contextvars.ContextVar[Optional["SamplingProfiler"]] = contextvars.ContextVar(
+    "profile_sampler", default=None
+)
+
+T = TypeVar("T")
+
+
+def annotate(**fields) -> None:
+    """
+    Attaches request inputs (image hash, LaTeX pair, ...) to the profile being
+    captured for the current request. A no-op when the request isn't profiled.
+    """
+    capture = _capture.get()
+    if capture is not None:
+        capture.update(fields)
+
+
+async def to_thread(func: Callable[..., T], *args, **kwargs) -> T:
+    """
+    `asyncio.to_thread` that keeps blocking work visible to the profiler: while
+    `func` runs, its worker thread is sampled as part of the calling request.
+    """
+    profiler = _profiler.get()
+    if profiler is None:
+        return await asyncio.to_thread(func, *args, **kwargs)
+
+    def run():
+        ident = threading.get_ident()
+        profiler.add_thread(ident)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.remove_thread(ident)
+
+    return await asyncio.to_thread(run)
+
+
+class SamplingProfiler:
+    """
+    Sample collector for one profiled request. Stacks are counted by the shared
+    `StackSampler` thread between `start` and `stop`.
+
+    Requests share the event-loop thread, so a loop sample is only credited when
+    `anchor` (the profiled request's middleware frame) is on the stack, i.e. when
+    this request's task is the one running. Worker threads doing blocking work for
+    the request (see `to_thread`) are sampled while they are registered.
+
+    Output is the "folded" format (`root;child;leaf count`) consumed by
+    flamegraph.pl, speedscope and inferno.
+    """
+
+    def __init__(self, thread_id: int, sampler: "StackSampler", anchor=None) -> None:
+        self.thread_id = thread_id
+        self.sampler = sampler
+        self.anchor = anchor
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._threads: Set[int] = set()
+
+    def add_thread(self, ident: int) -> None:
+        self._threads.add(ident)
+
+    def remove_thread(self, ident: int) -> None:
+        self._threads.discard(ident)
+
+    def start(self) -> None:
+        self.sampler.register(self)
+
+    def stop(self) -> None:
+        self.sampler.unregister(self)
+
+    def record(self, stack: str) -> None:
+        self.stacks[stack] += 1
+        self.samples += 1
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+class StackSampler:
+    """
+    Low-overhead statistical profiler shared by every profiled request: a single
+    background thread snapshots stacks every `interval_ms` and credits each one
+    to the requests it belongs to. Per tick the loop thread and each registered
+    worker are walked once, however many requests are being profiled. The thread
+    exits when no request is active and restarts on the next `register`.
+    """
+
+    def __init__(self, settings: "ProfilingSettings") -> None:
+        self.settings = settings
+        self._active: Set[SamplingProfiler] = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, profiler: SamplingProfiler) -> None:
+        with self._lock:
+            self._active.add(profiler)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+                self._thread.start()
+
+    def unregister(self, profiler: SamplingProfiler) -> None:
+        with self._lock:
+            self._active.discard(profiler)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.settings.interval_ms / 1000)
+            with self._lock:
+                active = list(self._active)
+                if not active:
+                    self._thread = None
+                    return
+            self._tick(active)
+
+    def _tick(self, active: List[SamplingProfiler]) -> None:
+        frames = sys._current_frames()
+        chains: Dict[int, list] = {}
+        folded: Dict[int, str] = {}
+
+        def chain(ident: int) -> list:
+            if ident not in chains:
+                stack, frame = [], frames.get(ident)
+                while frame is not None:
+                    stack.append(frame)
+                    frame = frame.f_back
+                chains[ident] = stack
+            return chains[ident]
+
+        def stack(ident: int) -> str:
+            if ident not in folded:
+                folded[ident] = ";".join(
+                    f"{f.f_code.co_name} ({Path(f.f_code.co_filename).name}:{f.f_code.co_firstlineno})"
+                    for f in reversed(chain(ident))
+                )
+            return folded[ident]
+
+        for profiler in active:
+            loop_chain = chain(profiler.thread_id)
+            if loop_chain and (profiler.anchor is None or any(f is profiler.anchor for f in loop_chain)):
+                profiler.record(stack(profiler.thread_id))
+            for ident in list(profiler._threads):
+                if chain(ident):
+                    profiler.record(stack(ident))
+
+
+@dataclass
+class ProfilingSettings:
+    slow_ms: float = PROFILE_SLOW_MS
+    interval_ms: float = PROFILE_INTERVAL_MS
+
+    @property
+    def auto_enabled(self) -> bool:
+        return self.slow_ms > 0
+
+
+class ProfileStore:
+    """One JSON file per captured request; oldest files are pruned past `max_files`."""
+
+    def __init__(self, directory: Path = PROFILE_DIR, max_files: int = PROFILE_MAX_FILES) -> None:
+        self.directory = Path(directory)
+        self.max_files = max_files
+
+    def save(self, profile: dict) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{profile['id']}.json"
+        path.write_text(json.dumps(profile), encoding="utf-8")
+
+        files = sorted(self.directory.glob("*.json"), key=lambda p: p.stat().st_mtime)
+        for stale in files[: max(len(files) - self.max_files, 0)]:
+            stale.unlink(missing_ok=True)
+
+    def list(self) -> List[dict]:
+        if not self.directory.is_dir():
+            return []
+        summaries = []
+        for path in self.directory.glob("*.json"):
+            try:
+                profile = json.loads(path.read_text(encoding="utf-8"))
+            except Exception:
+                continue
+            profile.pop("folded", None)
+            summaries.append(profile)
+        return sorted(summaries, key=lambda p: p["started_at"], reverse=True)
+
+    def get(self, profile_id: str) -> Optional[dict]:
+        # Only hex IDs are ever written, which also rules out path traversal.
+        if not profile_id or any(ch not in "0123456789abcdef" for ch in profile_id):
+            return None
+        path = self.directory / f"{profile_id}.json"
+        if not path.exists():
+            return None
+        return json.loads(path.read_text(encoding="utf-8"))
+
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware. When profiling is off (no slow-request threshold and no
+    admin token configured) requests go straight through with a single attribute
+    check. Otherwise a request is sampled if it carries `X-Profile: 1` with a
+    valid `X-Admin-Token`, or if automatic capture is on; automatically sampled
+    requests are only saved when they exceed the latency threshold.
+    """
+
+    def __init__(self, app, settings: ProfilingSettings, store: ProfileStore) -> None:
+        self.app = app
+        self.settings = settings
+        self.store = store
+        self.sampler = StackSampler(settings)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not (self.settings.auto_enabled or ADMIN_TOKEN):
+            await self.app(scope, receive, send)
+            return
+
+        requested = _header_requested(scope)
+        if not requested and not self.settings.auto_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        capture: dict = {}
+        profiler = SamplingProfiler(threading.get_ident(), self.sampler, anchor=sys._getframe())
+        token = _capture.set(capture)
+        profiler_token = _profiler.set(profiler)
+        status = {"code": None}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        started_at = time.time()
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.stop()
+            duration_ms = (time.perf_counter() - started) * 1000
+            _capture.reset(token)
+            _profiler.reset(profiler_token)
+
+            slow = self.settings.auto_enabled and duration_ms >= self.settings.slow_ms
+            if requested or slow:
+                # Writing and pruning profile files blocks; keep it off the event loop.
+                await asyncio.to_thread(
+                    self._save, scope, profiler, capture, started_at, duration_ms, status["code"], requested
+                )
+
+    def _save(self, scope, profiler, capture, started_at, duration_ms, status_code, requested):
+        profile = {
+            "id": uuid.uuid4().hex,
+            "method": scope.get("method"),
+            "path": scope.get("path"),
+            "status": status_code,
+            "trigger": "header" if requested else "slow",
+            "started_at": started_at,
+            "duration_ms": round(duration_ms, 3),
+            "interval_ms": self.settings.interval_ms,
+            "samples": profiler.samples,
+            "input": capture,
+            "folded": profiler.folded(),
+        }
+        try:
+            self.store.save(profile)
+        except Exception as exc:  # pragma: no cover - never fail the request
+            LOGGER.warning("Unable to save profile: %s", exc)
+
+
+def is_admin(token: Optional[str]) -> bool:
+    if not ADMIN_TOKEN or token is None:
+        return False
+    return hmac.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8"))
+
+
+def _header_requested(scope) -> bool:
+    headers: Dict[bytes, bytes] = dict(scope.get("headers") or ())
+    if headers.get(PROFILE_HEADER, b"").lower() not in {b"1", b"true"}:
+        return False
+    return is_admin(headers.get(ADMIN_HEADER, b"").decode("latin-1"))
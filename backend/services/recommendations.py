@@ -0,0 +1,367 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .rollups import RollupService
+from .tracker_db import Cursor, TrackerDatabase
+
+LOGGER = logging.getLogger(__name__)
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+QUESTIONS_PATH = REPO_ROOT / "data" / "questions.json"
+EDGES_PATH = REPO_ROOT / "data" / "graph" / "edges_F4_ALL.csv"
+QUESTIONS_PER_SET = int(os.getenv("AI_MARKING_RECOMMEND_QUESTIONS", "8"))
+FOCUS_CHAPTERS = int(os.getenv("AI_MARKING_RECOMMEND_FOCUS", "3"))
+USER_CHUNK = int(os.getenv("AI_MARKING_RECOMMEND_CHUNK", "4096"))
+
+# A chapter with no scored marks counts as half-mastered; real marks outweigh
+# this prior once a student has answered PRIOR_MARKS marks in it.
+PRIOR_WEAKNESS = 0.5
+PRIOR_MARKS = 10.0
+# Share of a chapter's weakness passed on to its prerequisites/related chapters.
+PROPAGATION = 0.5
+EDGE_WEIGHTS = {"prerequisite": 1.0, "related_to": 0.5}
+# Questions from papers the student already sat are only used as a last resort.
+ATTEMPTED_WEIGHT = 0.1
+# SPM Additional Mathematics allows roughly 1.5 minutes per mark.
+MINUTES_PER_MARK = 1.5
+
+_CHAPTER_RE = re.compile(r"^\s*(?:F(\d)C(\d+)(?!\d)|Form\s*(\d)\s*Chapter\s*(\d+))", re.IGNORECASE)
+_NAMESPACE = uuid.UUID("6f1d3c52-8a0e-4f7b-9d57-3e2b1f0c4a91")
+
+
+def chapter_code(label: Optional[str]) -> Optional[str]:
+    """`F4C2`, `F4C2_SKILL_01` and `Form 4 Chapter 2 - Quadratic Functions` all map to `F4C2`."""
+    match = _CHAPTER_RE.match(label or "")
+    if not match:
+        return None
+    form, number = (match.group(1), match.group(2)) if match.group(1) else match.group(3, 4)
+    return f"F{form}C{int(number)}"
+
+
+@dataclass
+class QuestionBank:
+    """Question bank as dense arrays over a fixed chapter axis."""
+
+    chapters: List[str]
+    chapter_names: List[str]
+    question_ids: List[str]
+    marks: np.ndarray  # (questions,)
+    incidence: np.ndarray  # (questions, chapters), rows sum to 1 for tagged questions
+    papers: Dict[Tuple[str, int, str], int]  # (state, year, paper_no) -> row of paper_questions
+    paper_questions: np.ndarray  # (papers, questions) bool
+
+    @classmethod
+    def load(cls, questions_path: Path, chapters: Sequence[str]) -> "QuestionBank":
+        questions = json.loads(Path(questions_path).read_text(encoding="utf-8"))
+        names: Dict[str, str] = {}
+        tagged = []
+        for question in questions:
+            codes = []
+            for label in question.get("chapter_examined") or []:
+                code = chapter_code(label)
+                if code:
+                    codes.append(code)
+                    names.setdefault(code, label)
+            tagged.append(codes)
+
+        chapters = sorted(set(chapters) | set(names), key=_chapter_sort_key)
+        column = {code: i for i, code in enumerate(chapters)}
+        incidence = np.zeros((len(questions), len(chapters)))
+        for row, codes in enumerate(tagged):
+            for code in codes:
+                incidence[row, column[code]] = 1.0 / len(codes)
+
+        papers: Dict[Tuple[str, int, str], int] = {}
+        paper_of = []
+        for question in questions:
+            key = (question["state"], int(question["year"]), question["paper_id"].rsplit("_", 1)[-1])
+            paper_of.append(papers.setdefault(key, len(papers)))
+        paper_questions = np.zeros((len(papers), len(questions)), dtype=bool)
+        paper_questions[paper_of, np.arange(len(questions))] = True
+
+        return cls(
+            chapters=chapters,
+            chapter_names=[names.get(code, code) for code in chapters],
+            question_ids=[question["id"] for question in questions],
+            marks=np.array([float(question.get("marks") or 0) for question in questions]),
+            incidence=incidence,
+            papers=papers,
+            paper_questions=paper_questions,
+        )
+
+
+@dataclass
+class RecommendationRun:
+    week_start: str
+    users: int
+    sets: List[dict] = field(default_factory=list)
+    seconds: float = 0.0
+
+
+class RecommendationEngine:
+    """
+    Builds the weekly `tracker_recommendation_sets` for every tracked student in
+    one pass.
+
+    Per-chapter marks come from `tracker_rollup_chapter` and become a dense
+    user x chapter weakness matrix. Weakness is spread along the chapter-level
+    prerequisite graph, so a student struggling with Integration is also pointed
+    at Differentiation. Every question in the bank is then scored for every user
+    with a single matrix product per chunk of users.
+    """
+
+    def __init__(
+        self,
+        db: TrackerDatabase,
+        rollups: Optional[RollupService] = None,
+        questions_path: Path = QUESTIONS_PATH,
+        edges_path: Path = EDGES_PATH,
+        questions_per_set: int = QUESTIONS_PER_SET,
+        focus_chapters: int = FOCUS_CHAPTERS,
+    ) -> None:
+        self.db = db
+        self.rollups = rollups or RollupService(db)
+        self.questions_per_set = questions_per_set
+        self.focus_chapters = focus_chapters
+
+        edges = _load_chapter_edges(Path(edges_path))
+        graph_chapters = {code for edge in edges for code in edge[:2]}
+        self.bank = QuestionBank.load(questions_path, graph_chapters)
+        self.propagation = _propagation_matrix(self.bank.chapters, edges)
+
+    def weakness_matrix(self, cur: Cursor) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """Returns (user_ids, weakness (users, chapters), attempted papers (users, papers))."""
+        cur.execute("SELECT user_id, chapter, score_sum, max_sum FROM tracker_rollup_chapter")
+        rollup = cur.fetchall()
+        cur.execute("SELECT DISTINCT user_id, state, year, paper_no FROM tracker_results")
+        results = cur.fetchall()
+
+        user_ids = sorted({row[0] for row in results} | {row[0] for row in rollup})
+        user_index = {user_id: i for i, user_id in enumerate(user_ids)}
+        column = {code: i for i, code in enumerate(self.bank.chapters)}
+
+        score = np.zeros((len(user_ids), len(self.bank.chapters)))
+        marks = np.zeros_like(score)
+        if rollup:
+            users, labels, scores, maxes = zip(*rollup)
+            unique_labels, label_of_row = np.unique(np.array(labels, dtype=object), return_inverse=True)
+            label_columns = np.array([column.get(chapter_code(label), -1) for label in unique_labels])
+            cols = label_columns[label_of_row]
+            rows = np.array([user_index[user_id] for user_id in users])
+            keep = cols >= 0
+            np.add.at(score, (rows[keep], cols[keep]), np.asarray(scores, dtype=float)[keep])
+            np.add.at(marks, (rows[keep], cols[keep]), np.asarray(maxes, dtype=float)[keep])
+        weakness = (marks - score + PRIOR_WEAKNESS * PRIOR_MARKS) / (marks + PRIOR_MARKS)
+
+        attempted = np.zeros((len(user_ids), len(self.bank.papers)), dtype=bool)
+        for user_id, state, year, paper_no in results:
+            paper = self.bank.papers.get((state, int(year), paper_no))
+            if paper is not None:
+                attempted[user_index[user_id], paper] = True
+        return user_ids, np.clip(weakness, 0.0, 1.0), attempted
+
+    def score(self, weakness: np.ndarray, attempted: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns (chapter need (users, chapters), question scores (users, questions))."""
+        need = weakness + PROPAGATION * (weakness @ self.propagation)
+        scores = need @ self.bank.incidence.T
+        seen = (attempted.astype(np.float32) @ self.bank.paper_questions.astype(np.float32)) > 0
+        scores[seen] *= ATTEMPTED_WEIGHT
+        return need, scores
+
+    def generate(self, week_start: str) -> RecommendationRun:
+        started = time.perf_counter()
+        with self.db.transaction() as cur:
+            user_ids, weakness, attempted = self.weakness_matrix(cur)
+
+        run = RecommendationRun(week_start=week_start, users=len(user_ids))
+        n_questions = min(self.questions_per_set, len(self.bank.question_ids))
+        n_focus = min(self.focus_chapters, len(self.bank.chapters))
+        question_ids = np.array(self.bank.question_ids, dtype=object)
+        chapter_names = np.array(self.bank.chapter_names, dtype=object)
+
+        for start in range(0, len(user_ids), USER_CHUNK):
+            chunk = slice(start, start + USER_CHUNK)
+            need, scores = self.score(weakness[chunk], attempted[chunk])
+            picks = _top_k(scores, n_questions)
+            focus = _top_k(need, n_focus)
+            minutes = np.rint(self.bank.marks[picks].sum(axis=1) * MINUTES_PER_MARK).astype(int)
+
+            for offset, user_id in enumerate(user_ids[chunk]):
+                subtopics = chapter_names[focus[offset]].tolist()
+                run.sets.append(
+                    {
+                        "id": str(uuid.uuid5(_NAMESPACE, f"{user_id}:{week_start}")),
+                        "user_id": user_id,
+                        "week_start": week_start,
+                        "subtopics": subtopics,
+                        "question_ids": question_ids[picks[offset]].tolist(),
+                        "estimated_time_min": int(minutes[offset]),
+                        "title": f"Week of {week_start}",
+                        "description": "Focus: " + ", ".join(subtopics),
+                    }
+                )
+
+        run.seconds = time.perf_counter() - started
+        return run
+
+    def save(self, run: RecommendationRun) -> None:
+        """
+        Upserts the sets (IDs are derived from user and week, so re-running a week
+        replaces it) and archives earlier active sets. `carries_forward` marks sets
+        that keep a focus chapter from the student's set of the previous week.
+        """
+        last_week = (date.fromisoformat(run.week_start) - timedelta(days=7)).isoformat()
+        with self.db.transaction() as cur:
+            cur.execute(
+                "SELECT user_id, subtopics FROM tracker_recommendation_sets WHERE week_start = ?",
+                (last_week,),
+            )
+            previous: Dict[str, set] = {}
+            for user_id, subtopics in cur.fetchall():
+                previous.setdefault(user_id, set()).update(_from_array(subtopics))
+
+            array = (lambda values: values) if cur.dialect == "postgres" else json.dumps
+            cur.executemany(
+                """
+                INSERT INTO tracker_recommendation_sets (id, user_id, week_start, subtopics,
+                  question_ids, estimated_time_min, status, title, description, carries_forward)
+                VALUES (?, ?, ?, ?, ?, ?, 'active', ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET
+                  subtopics = excluded.subtopics,
+                  question_ids = excluded.question_ids,
+                  estimated_time_min = excluded.estimated_time_min,
+                  status = excluded.status,
+                  title = excluded.title,
+                  description = excluded.description,
+                  carries_forward = excluded.carries_forward
+                """,
+                [
+                    (
+                        item["id"],
+                        item["user_id"],
+                        item["week_start"],
+                        array(item["subtopics"]),
+                        array(item["question_ids"]),
+                        item["estimated_time_min"],
+                        item["title"],
+                        item["description"],
+                        bool(previous.get(item["user_id"], set()) & set(item["subtopics"])),
+                    )
+                    for item in run.sets
+                ],
+            )
+            cur.execute(
+                "UPDATE tracker_recommendation_sets SET status = 'archived' "
+                "WHERE status = 'active' AND week_start < ?",
+                (run.week_start,),
+            )
+
+    def run(self, week_start: Optional[str] = None, dry_run: bool = False) -> RecommendationRun:
+        week_start = week_start or current_week_start()
+        self.rollups.catch_up()
+        run = self.generate(week_start)
+        if not dry_run:
+            self.save(run)
+        LOGGER.info(
+            "Generated %d recommendation sets for week %s in %.2fs.",
+            len(run.sets),
+            week_start,
+            run.seconds,
+        )
+        return run
+
+
+def current_week_start(today: Optional[date] = None) -> str:
+    today = today or date.today()
+    return (today - timedelta(days=today.weekday())).isoformat()
+
+
+def _load_chapter_edges(path: Path) -> List[Tuple[str, str, str]]:
+    """Collapses skill/concept edges into (from_chapter, to_chapter, relation) edges."""
+    edges = []
+    with open(path, "r", encoding="utf-8", newline="") as handle:
+        for row in csv.reader(handle):
+            if len(row) < 3 or row[0].startswith("#"):
+                continue
+            source, target, relation = chapter_code(row[0]), chapter_code(row[1]), row[2].strip()
+            if source and target and source != target and relation in EDGE_WEIGHTS:
+                edges.append((source, target, relation))
+    return edges
+
+
+def _propagation_matrix(chapters: Sequence[str], edges) -> np.ndarray:
+    """
+    Row-normalized (chapters, chapters) matrix where [k, j] is the share of
+    weakness in chapter k that becomes need for chapter j. Prerequisites receive
+    weakness from the chapters that depend on them; related chapters share both
+    ways.
+    """
+    column = {code: i for i, code in enumerate(chapters)}
+    matrix = np.zeros((len(chapters), len(chapters)))
+    for source, target, relation in edges:
+        s, t = column[source], column[target]
+        matrix[t, s] += EDGE_WEIGHTS[relation]
+        if relation == "related_to":
+            matrix[s, t] += EDGE_WEIGHTS[relation]
+    totals = matrix.sum(axis=1, keepdims=True)
+    return np.divide(matrix, totals, out=np.zeros_like(matrix), where=totals > 0)
+
+
+def _top_k(values: np.ndarray, k: int) -> np.ndarray:
+    """Column indices of the k largest values per row, best first."""
+    if k <= 0 or values.shape[1] == 0:
+        return np.zeros((values.shape[0], 0), dtype=int)
+    part = np.argpartition(-values, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(values, part, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1)
+
+
+def _from_array(value) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):  # SQLite stores arrays as JSON text
+        return json.loads(value or "[]")
+    return list(value)
+
+
+def _chapter_sort_key(code: str):
+    form, number = code[1:].split("C")
+    return int(form), int(number)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Generate weekly tracker recommendation sets.")
+    ap.add_argument("--week-start", help="ISO date of the week (default: this Monday)")
+    ap.add_argument("--dry-run", action="store_true", help="Score users without writing sets")
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    db = TrackerDatabase.from_env()
+    if db is None:
+        raise SystemExit("Set DATABASE_URL (postgres://... or sqlite:///path.db).")
+    db.ensure_schema()
+    try:
+        run = RecommendationEngine(db).run(args.week_start, dry_run=args.dry_run)
+    finally:
+        db.close()
+    if args.dry_run:
+        for item in run.sets[:5]:
+            print(json.dumps(item, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
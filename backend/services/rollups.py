@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+import argparse
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .tracker_db import Cursor, TrackerDatabase
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .tracker import ResultQuestion
+
+LOGGER = logging.getLogger(__name__)
+
+# (user_id, date_done, questions, sign): +1 adds an attempt's questions, -1 retracts them.
+Change = Tuple[str, str, Sequence["ResultQuestion"], int]
+
+
+@dataclass
+class ScoreAggregate:
+    score: float
+    max_score: float
+    questions: int
+    chapter: Optional[str] = None
+    subtopic: Optional[str] = None
+    cognitive: Optional[str] = None
+
+    @property
+    def percent(self) -> Optional[float]:
+        if not self.max_score:
+            return None
+        return round(100.0 * self.score / self.max_score, 1)
+
+
+class RollupService:
+    """
+    Maintains per-user score aggregates by chapter, cognitive level and
+    (chapter, subtopic, day) so dashboards never scan tracker_result_questions.
+
+    On Postgres the triggers in db/migrations/002_tracker_rollups.sql apply
+    exact deltas for every writer, including the Next.js API, in the same
+    transaction as the attempt; `apply` and `record` are then no-ops. The SQLite
+    stand-in has no triggers, so `TrackerRepository` applies the deltas here.
+    Results written without either (e.g. before the migration) are detected
+    through `tracker_rollup_ledger` and repaired per user by `catch_up` or
+    lazily by `ensure_fresh` before a dashboard read.
+    """
+
+    def __init__(self, db: TrackerDatabase) -> None:
+        self.db = db
+
+    # Writes
+    def apply(self, cur: Cursor, changes: Iterable[Change]) -> None:
+        if cur.dialect == "postgres":
+            return  # maintained by the tracker_rollup_* triggers
+        chapter: Dict[tuple, List[float]] = defaultdict(lambda: [0.0, 0.0, 0])
+        cognitive: Dict[tuple, List[float]] = defaultdict(lambda: [0.0, 0.0, 0])
+        daily: Dict[tuple, List[float]] = defaultdict(lambda: [0.0, 0.0, 0])
+        users = set()
+
+        for user_id, date_done, questions, sign in changes:
+            users.add(user_id)
+            for q in questions:
+                if q.score is None:
+                    continue
+                for bucket, key in (
+                    (chapter, (user_id, q.chapter or "")),
+                    (cognitive, (user_id, q.cognitive or "")),
+                    (daily, (user_id, q.chapter or "", q.subtopic or "", str(date_done))),
+                ):
+                    agg = bucket[key]
+                    agg[0] += sign * q.score
+                    agg[1] += sign * q.max_score
+                    agg[2] += sign
+
+        cur.executemany(
+            _format_upsert("tracker_rollup_chapter", "user_id, chapter"),
+            [(*key, *agg) for key, agg in chapter.items() if any(agg)],
+        )
+        cur.executemany(
+            _format_upsert("tracker_rollup_cognitive", "user_id, cognitive"),
+            [(*key, *agg) for key, agg in cognitive.items() if any(agg)],
+        )
+        cur.executemany(
+            _format_upsert("tracker_rollup_subtopic_daily", "user_id, chapter, subtopic, date_done"),
+            [(*key, *agg) for key, agg in daily.items() if any(agg)],
+        )
+        for table in _ROLLUP_TABLES:
+            cur.executemany(
+                f"DELETE FROM {table} WHERE user_id = ? AND question_count <= 0",
+                [(user_id,) for user_id in users],
+            )
+
+    def record(self, cur: Cursor, result_ids: Iterable[str]) -> None:
+        """Marks the current version of these results as reflected in the rollups."""
+        if cur.dialect == "postgres":
+            return  # maintained by the tracker_rollup_* triggers
+        cur.executemany(
+            """
+            INSERT INTO tracker_rollup_ledger (result_id, user_id, updated_at)
+            SELECT result_id, user_id, updated_at FROM tracker_results WHERE result_id = ?
+            ON CONFLICT (result_id) DO UPDATE SET updated_at = excluded.updated_at
+            """,
+            [(result_id,) for result_id in result_ids],
+        )
+
+    def rebuild_user(self, cur: Cursor, user_id: str) -> None:
+        for table in (*_ROLLUP_TABLES, "tracker_rollup_ledger"):
+            cur.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
+
+        for table, columns in (
+            ("tracker_rollup_chapter", "COALESCE(q.chapter, '')"),
+            ("tracker_rollup_cognitive", "COALESCE(q.cognitive, '')"),
+            (
+                "tracker_rollup_subtopic_daily",
+                "COALESCE(q.chapter, ''), COALESCE(q.subtopic, ''), r.date_done",
+            ),
+        ):
+            cur.execute(
+                f"""
+                INSERT INTO {table}
+                SELECT r.user_id, {columns}, SUM(q.score), SUM(q.max_score), COUNT(*)
+                FROM tracker_results r
+                JOIN tracker_result_questions q ON q.result_id = r.result_id
+                WHERE r.user_id = ? AND q.score IS NOT NULL
+                GROUP BY r.user_id, {columns}
+                """,
+                (user_id,),
+            )
+
+        cur.execute(
+            """
+            INSERT INTO tracker_rollup_ledger (result_id, user_id, updated_at)
+            SELECT result_id, user_id, updated_at FROM tracker_results WHERE user_id = ?
+            """,
+            (user_id,),
+        )
+
+    def stale_users(self, cur: Cursor, user_id: Optional[str] = None) -> List[str]:
+        user_filter = "AND r.user_id = ?" if user_id else ""
+        ledger_filter = "AND l.user_id = ?" if user_id else ""
+        params = (user_id, user_id) if user_id else ()
+        cur.execute(
+            f"""
+            SELECT r.user_id FROM tracker_results r
+            LEFT JOIN tracker_rollup_ledger l ON l.result_id = r.result_id
+            WHERE (l.result_id IS NULL OR l.updated_at <> r.updated_at) {user_filter}
+            UNION
+            SELECT l.user_id FROM tracker_rollup_ledger l
+            LEFT JOIN tracker_results r ON r.result_id = l.result_id
+            WHERE r.result_id IS NULL {ledger_filter}
+            """,
+            params,
+        )
+        return sorted(row[0] for row in cur.fetchall())
+
+    def catch_up(self) -> List[str]:
+        """Rebuilds rollups for every user with results written outside this service."""
+        with self.db.transaction() as cur:
+            users = self.stale_users(cur)
+        for user_id in users:
+            with self.db.transaction() as cur:
+                self.rebuild_user(cur, user_id)
+        return users
+
+    def ensure_fresh(self, user_id: str) -> bool:
+        with self.db.transaction() as cur:
+            if not self.stale_users(cur, user_id):
+                return False
+            self.rebuild_user(cur, user_id)
+        return True
+
+    # Dashboard reads
+    def chapter_scores(self, user_id: str) -> List[ScoreAggregate]:
+        with self.db.transaction() as cur:
+            cur.execute(
+                "SELECT chapter, score_sum, max_sum, question_count "
+                "FROM tracker_rollup_chapter WHERE user_id = ? ORDER BY chapter",
+                (user_id,),
+            )
+            rows = cur.fetchall()
+        return [ScoreAggregate(float(s), float(m), int(n), chapter=c) for c, s, m, n in rows]
+
+    def cognitive_scores(self, user_id: str) -> List[ScoreAggregate]:
+        with self.db.transaction() as cur:
+            cur.execute(
+                "SELECT cognitive, score_sum, max_sum, question_count "
+                "FROM tracker_rollup_cognitive WHERE user_id = ? ORDER BY cognitive",
+                (user_id,),
+            )
+            rows = cur.fetchall()
+        return [ScoreAggregate(float(s), float(m), int(n), cognitive=c) for c, s, m, n in rows]
+
+    def subtopic_scores(
+        self,
+        user_id: str,
+        since: Optional[str] = None,
+        min_questions: int = 0,
+        weakest: Optional[int] = None,
+    ) -> List[ScoreAggregate]:
+        """
+        Subtopic scores, optionally limited to attempts done on/after `since`.
+        With `weakest=N`, returns the N lowest-scoring subtopics that have at least
+        `min_questions` answered questions (the dashboard's Weak Links).
+        """
+        where = "user_id = ?" + (" AND date_done >= ?" if since else "")
+        params: list = [user_id] + ([since] if since else []) + [min_questions]
+        order = "SUM(score_sum) / SUM(max_sum), chapter, subtopic" if weakest else "chapter, subtopic"
+        limit = " LIMIT ?" if weakest else ""
+        if weakest:
+            params.append(weakest)
+
+        with self.db.transaction() as cur:
+            cur.execute(
+                f"""
+                SELECT chapter, subtopic, SUM(score_sum), SUM(max_sum), SUM(question_count)
+                FROM tracker_rollup_subtopic_daily
+                WHERE {where}
+                GROUP BY chapter, subtopic
+                HAVING SUM(question_count) >= ? AND SUM(max_sum) > 0
+                ORDER BY {order}{limit}
+                """,
+                params,
+            )
+            rows = cur.fetchall()
+        return [
+            ScoreAggregate(float(s), float(m), int(n), chapter=c, subtopic=t)
+            for c, t, s, m, n in rows
+        ]
+
+
+_ROLLUP_TABLES = (
+    "tracker_rollup_chapter",
+    "tracker_rollup_cognitive",
+    "tracker_rollup_subtopic_daily",
+)
+
+_UPSERT = """
+INSERT INTO {table} ({keys}, score_sum, max_sum, question_count)
+VALUES ({placeholders})
+ON CONFLICT ({keys}) DO UPDATE SET
+  score_sum = {table}.score_sum + excluded.score_sum,
+  max_sum = {table}.max_sum + excluded.max_sum,
+  question_count = {table}.question_count + excluded.question_count
+"""
+
+
+def _format_upsert(table: str, keys: str) -> str:
+    placeholders = ", ".join("?" for _ in range(len(keys.split(",")) + 3))
+    return _UPSERT.format(table=table, keys=keys, placeholders=placeholders)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Maintain tracker rollup tables.")
+    ap.add_argument(
+        "command",
+        choices=["catch-up", "rebuild"],
+        help="catch-up: repair users with out-of-band writes; rebuild: recompute every user",
+    )
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    db = TrackerDatabase.from_env()
+    if db is None:
+        raise SystemExit("Set DATABASE_URL (postgres://... or sqlite:///path.db).")
+    db.ensure_schema()
+    rollups = RollupService(db)
+
+    if args.command == "rebuild":
+        with db.transaction() as cur:
+            cur.execute(
+                "SELECT user_id FROM tracker_results UNION SELECT user_id FROM tracker_rollup_ledger"
+            )
+            users = [row[0] for row in cur.fetchall()]
+        for user_id in users:
+            with db.transaction() as cur:
+                rollups.rebuild_user(cur, user_id)
+    else:
+        users = rollups.catch_up()
+    LOGGER.info("Rebuilt rollups for %d users.", len(users))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import logging
+import math
+import os
+import pickle
+import re
+import time
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Set, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+QUESTIONS_PATH = REPO_ROOT / "data" / "questions.json"
+OCR_CACHE_DIR = REPO_ROOT / "data" / "artifacts" / "ocr_cache"
+SEARCH_INDEX_PATH = Path(
+    os.getenv(
+        "AI_MARKING_SEARCH_INDEX",
+        str(REPO_ROOT / "backend" / ".cache" / "search-index.pkl"),
+    )
+)
+
+# Bump whenever tokenization or the pickled layout changes.
+INDEX_VERSION = 1
+
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+
+def normalize_text(text: str) -> str:
+    """Lowercases, strips accents and collapses everything but [0-9a-z] to spaces."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _NON_WORD.sub(" ", text.lower()).strip()
+
+
+def trigrams(word: str) -> Set[str]:
+    """
+    Character trigrams of a normalized word, padded like pg_trgm ("  x", " xy",
+    ..., "yz ") so short words and word boundaries still produce grams. A single
+    typo only disturbs the grams that overlap it, which is what makes matching fuzzy.
+    """
+    padded = f"  {word} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass
+class SearchHit:
+    question_id: str
+    score: float
+    snippet: str
+
+
+class TrigramIndex:
+    """
+    Two-level index over the noisy bilingual OCR text: character trigrams map to
+    vocabulary words, and words map to question IDs. Query words are matched
+    against the vocabulary by trigram similarity, so misspellings on either side
+    still find each other.
+
+    Documents are fingerprinted, so `update` only re-indexes questions whose text
+    changed; the index itself is pickled between runs.
+    """
+
+    def __init__(self) -> None:
+        self.gram_words: Dict[str, Set[str]] = defaultdict(set)
+        self.word_docs: Dict[str, Set[str]] = defaultdict(set)
+        self.word_gram_counts: Dict[str, int] = {}
+        self.doc_words: Dict[str, Set[str]] = {}
+        self.fingerprints: Dict[str, str] = {}
+        self.texts: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self.doc_words)
+
+    def add(self, doc_id: str, text: str) -> None:
+        """Adds or replaces a single document."""
+        if doc_id in self.doc_words:
+            self.remove(doc_id)
+        words = set(normalize_text(text).split())
+        for word in words:
+            if word not in self.word_docs:
+                grams = trigrams(word)
+                for gram in grams:
+                    self.gram_words[gram].add(word)
+                self.word_gram_counts[word] = len(grams)
+            self.word_docs[word].add(doc_id)
+        self.doc_words[doc_id] = words
+        self.fingerprints[doc_id] = _fingerprint(text)
+        self.texts[doc_id] = text
+
+    def remove(self, doc_id: str) -> None:
+        for word in self.doc_words.pop(doc_id, ()):
+            docs = self.word_docs.get(word)
+            if docs is None:
+                continue
+            docs.discard(doc_id)
+            if docs:
+                continue
+            del self.word_docs[word]
+            del self.word_gram_counts[word]
+            for gram in trigrams(word):
+                bucket = self.gram_words.get(gram)
+                if bucket is not None:
+                    bucket.discard(word)
+                    if not bucket:
+                        del self.gram_words[gram]
+        self.fingerprints.pop(doc_id, None)
+        self.texts.pop(doc_id, None)
+
+    def update(self, documents: Dict[str, str]) -> Tuple[int, int]:
+        """
+        Syncs the index with `documents`, touching only new, changed or removed
+        entries. Returns (indexed, removed).
+        """
+        indexed = 0
+        for doc_id, text in documents.items():
+            if self.fingerprints.get(doc_id) != _fingerprint(text):
+                self.add(doc_id, text)
+                indexed += 1
+
+        stale = [doc_id for doc_id in self.doc_words if doc_id not in documents]
+        for doc_id in stale:
+            self.remove(doc_id)
+        return indexed, len(stale)
+
+    def similar_words(self, word: str, threshold: float = 0.3) -> Dict[str, float]:
+        """Vocabulary words whose trigram Jaccard similarity to `word` is >= threshold."""
+        query_grams = trigrams(word)
+        shared: Dict[str, int] = defaultdict(int)
+        for gram in query_grams:
+            for candidate in self.gram_words.get(gram, ()):
+                shared[candidate] += 1
+
+        matches = {}
+        for candidate, overlap in shared.items():
+            union = len(query_grams) + self.word_gram_counts[candidate] - overlap
+            similarity = overlap / union
+            if similarity >= threshold:
+                matches[candidate] = similarity
+        return matches
+
+    def search(
+        self,
+        query: str,
+        limit: int = 10,
+        min_score: float = 0.3,
+        similarity: float = 0.3,
+    ) -> List[SearchHit]:
+        """
+        Each query word contributes its best fuzzy match in a document, weighted by
+        how rare the query word's closest vocabulary match is. Scores are
+        normalized to [0, 1], where 1 means every query word matched exactly.
+        """
+        query_words = list(dict.fromkeys(normalize_text(query).split()))
+        if not query_words or not self.doc_words:
+            return []
+
+        total_docs = len(self.doc_words)
+        scores: Dict[str, float] = defaultdict(float)
+        denominator = 0.0
+        for word in query_words:
+            matches = self.similar_words(word, threshold=similarity)
+            if matches:
+                anchor = max(matches, key=lambda w: (matches[w], len(self.word_docs[w])))
+                weight = math.log(1 + total_docs / len(self.word_docs[anchor]))
+            else:
+                weight = math.log(1 + total_docs)
+            denominator += weight
+
+            best: Dict[str, float] = {}
+            for candidate, sim in matches.items():
+                for doc_id in self.word_docs[candidate]:
+                    if sim > best.get(doc_id, 0.0):
+                        best[doc_id] = sim
+            for doc_id, sim in best.items():
+                scores[doc_id] += sim * weight
+
+        ranked = sorted(
+            ((score / denominator, doc_id) for doc_id, score in scores.items()),
+            key=lambda item: (-item[0], item[1]),
+        )
+        return [
+            SearchHit(
+                question_id=doc_id,
+                score=round(score, 4),
+                snippet=_snippet(self.texts.get(doc_id, ""), query),
+            )
+            for score, doc_id in ranked[:limit]
+            if score >= min_score
+        ]
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with tmp_path.open("wb") as handle:
+            pickle.dump(
+                {
+                    "version": INDEX_VERSION,
+                    "gram_words": dict(self.gram_words),
+                    "word_docs": dict(self.word_docs),
+                    "word_gram_counts": self.word_gram_counts,
+                    "doc_words": self.doc_words,
+                    "fingerprints": self.fingerprints,
+                    "texts": self.texts,
+                },
+                handle,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> "TrigramIndex":
+        index = cls()
+        if not path.exists():
+            return index
+        try:
+            with path.open("rb") as handle:
+                payload = pickle.load(handle)
+        except Exception as exc:
+            LOGGER.warning("Ignoring unreadable search index: %s", exc)
+            return index
+        if payload.get("version") != INDEX_VERSION:
+            return index
+
+        index.gram_words = defaultdict(set, payload["gram_words"])
+        index.word_docs = defaultdict(set, payload["word_docs"])
+        index.word_gram_counts = payload["word_gram_counts"]
+        index.doc_words = payload["doc_words"]
+        index.fingerprints = payload["fingerprints"]
+        index.texts = payload["texts"]
+        return index
+
+
+class QuestionSearch:
+    """
+    Keeps a `TrigramIndex` in sync with `data/questions.json` and the OCR cache.
+    """
+
+    def __init__(
+        self,
+        questions_path: Path = QUESTIONS_PATH,
+        ocr_cache_dir: Path = OCR_CACHE_DIR,
+        index_path: Path = SEARCH_INDEX_PATH,
+    ) -> None:
+        self.questions_path = Path(questions_path)
+        self.ocr_cache_dir = Path(ocr_cache_dir)
+        self.index_path = Path(index_path)
+        self.index = TrigramIndex()
+
+    def refresh(self) -> Tuple[int, int]:
+        """Loads the pickled index and re-indexes only what changed on disk."""
+        if not len(self.index):
+            self.index = TrigramIndex.load(self.index_path)
+
+        indexed, removed = self.index.update(dict(self._documents()))
+        if indexed or removed:
+            try:
+                self.index.save(self.index_path)
+            except Exception as exc:  # pragma: no cover - cache is best-effort
+                LOGGER.warning("Unable to write search index: %s", exc)
+        LOGGER.info(
+            "Search index ready: %d questions (%d re-indexed, %d removed).",
+            len(self.index),
+            indexed,
+            removed,
+        )
+        return indexed, removed
+
+    def search(self, query: str, limit: int = 10, min_score: float = 0.3) -> List[SearchHit]:
+        return self.index.search(query, limit=limit, min_score=min_score)
+
+    def _documents(self) -> Iterable[Tuple[str, str]]:
+        texts: Dict[str, List[str]] = defaultdict(list)
+        if self.questions_path.exists():
+            with self.questions_path.open("r", encoding="utf-8") as handle:
+                for item in json.load(handle):
+                    if item.get("ocr_text"):
+                        texts[item["id"]].append(item["ocr_text"])
+
+        if self.ocr_cache_dir.is_dir():
+            for cache_file in sorted(self.ocr_cache_dir.glob("*.txt")):
+                text = cache_file.read_text(encoding="utf-8", errors="ignore").strip()
+                if text:
+                    texts[cache_file.stem].append(text)
+
+        for doc_id, parts in texts.items():
+            yield doc_id, "\n".join(parts)
+
+
+def _fingerprint(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _snippet(text: str, query: str, width: int = 160) -> str:
+    flat = " ".join(text.split())
+    lowered = flat.lower()
+    position = -1
+    for word in sorted(normalize_text(query).split(), key=len, reverse=True):
+        position = lowered.find(word)
+        if position >= 0:
+            break
+    start = max(position - width // 4, 0) if position >= 0 else 0
+    snippet = flat[start : start + width]
+    return ("…" if start else "") + snippet + ("…" if start + width < len(flat) else "")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Fuzzy search over question OCR text.")
+    ap.add_argument("query", nargs="*", help="Search terms (English or Malay)")
+    ap.add_argument("--limit", type=int, default=10)
+    ap.add_argument("--min-score", type=float, default=0.3)
+    ap.add_argument("--rebuild", action="store_true", help="Discard the saved index first")
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    search = QuestionSearch()
+    if args.rebuild and search.index_path.exists():
+        search.index_path.unlink()
+    search.refresh()
+
+    if not args.query:
+        return
+
+    started = time.perf_counter()
+    hits = search.search(" ".join(args.query), limit=args.limit, min_score=args.min_score)
+    took_ms = (time.perf_counter() - started) * 1000
+
+    for hit in hits:
+        print(f"{hit.score:.3f}  {hit.question_id}  {hit.snippet}")
+    print(f"[INFO] {len(hits)} hits in {took_ms:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import logging
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .rollups import RollupService
+from .tracker_db import Cursor, TrackerDatabase
+
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class ResultQuestion:
+    q_no: int
+    section: str
+    max_score: float
+    score: Optional[float] = None
+    chapter: Optional[str] = None
+    subtopic: Optional[str] = None
+    cognitive: Optional[str] = None
+
+
+@dataclass
+class Attempt:
+    """One past-paper attempt, mirroring `ResultUpsertPayload` in lib/tracker/types.ts."""
+
+    user_id: str
+    state: str
+    year: int
+    paper_no: str
+    date_done: str
+    time_spent_min: Optional[int] = None
+    notes: Optional[str] = None
+    by_question: List[ResultQuestion] = field(default_factory=list)
+
+    @property
+    def total_score(self) -> float:
+        return sum(q.score for q in self.by_question if q.score is not None)
+
+    @property
+    def total_max(self) -> float:
+        return sum(q.max_score for q in self.by_question)
+
+
+class TrackerRepository:
+    """
+    Python counterpart of lib/tracker/repository.ts. Attempts are upserted on the
+    `tracker_results_unique_attempt` key, and the rollup tables are updated in the
+    same transaction.
+    """
+
+    def __init__(self, db: TrackerDatabase, rollups: Optional[RollupService] = None) -> None:
+        self.db = db
+        self.rollups = rollups or RollupService(db)
+
+    def upsert_attempt(self, attempt: Attempt) -> str:
+        return self.upsert_attempts([attempt])[0]
+
+    def upsert_attempts(self, attempts: Sequence[Attempt], batch_size: int = 500) -> List[str]:
+        """Upserts attempts in transactions of `batch_size`; returns their result IDs in order."""
+        result_ids: List[str] = []
+        for start in range(0, len(attempts), batch_size):
+            with self.db.transaction() as cur:
+                result_ids.extend(self._upsert_batch(cur, attempts[start : start + batch_size]))
+        return result_ids
+
+    def _upsert_batch(self, cur: Cursor, attempts: Sequence[Attempt]) -> List[str]:
+        # A later duplicate of the same attempt within a batch wins, as it would row by row.
+        latest: Dict[AttemptKey, Attempt] = {_key(attempt): attempt for attempt in attempts}
+        keys = sorted(latest)
+
+        # Create missing attempts and lock existing ones before reading anything, so
+        # an attempt a concurrent writer creates meanwhile is replaced like any other.
+        cur.executemany(
+            """
+            INSERT INTO tracker_results (result_id, user_id, state, year, paper_no,
+              date_done, time_spent_min, notes, total_score, total_max)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (user_id, state, year, paper_no) DO UPDATE SET
+              updated_at = CURRENT_TIMESTAMP
+            """,
+            [
+                (str(uuid.uuid4()), *key, latest[key].date_done, None, None, 0, 0)
+                for key in keys
+            ],
+        )
+        stored = self._existing(cur, latest)
+        ids = {key: result_id for key, (result_id, _) in stored.items()}
+
+        # Retract whatever questions are stored now; new attempts have none.
+        changes = []
+        by_result = {result_id: key for key, result_id in ids.items()}
+        for chunk in _chunks(sorted(by_result)):
+            cur.execute(
+                "SELECT result_id, max_score, score, chapter, subtopic, cognitive "
+                f"FROM tracker_result_questions WHERE result_id IN ({_marks(chunk)})",
+                chunk,
+            )
+            retracted: Dict[str, List[ResultQuestion]] = defaultdict(list)
+            for result_id, m, score, chapter, subtopic, cognitive in cur.fetchall():
+                retracted[str(result_id)].append(
+                    ResultQuestion(
+                        q_no=0,
+                        section="",
+                        max_score=float(m),
+                        score=_num(score),
+                        chapter=chapter,
+                        subtopic=subtopic,
+                        cognitive=cognitive,
+                    )
+                )
+            for result_id, questions in retracted.items():
+                key = by_result[result_id]
+                changes.append((key[0], stored[key][1], questions, -1))
+            cur.execute(
+                f"DELETE FROM tracker_result_questions WHERE result_id IN ({_marks(chunk)})",
+                chunk,
+            )
+
+        cur.executemany(
+            """
+            UPDATE tracker_results SET
+              date_done = ?,
+              time_spent_min = ?,
+              notes = ?,
+              total_score = ?,
+              total_max = ?,
+              updated_at = CURRENT_TIMESTAMP
+            WHERE result_id = ?
+            """,
+            [
+                (
+                    attempt.date_done,
+                    attempt.time_spent_min,
+                    attempt.notes,
+                    attempt.total_score,
+                    attempt.total_max,
+                    ids[key],
+                )
+                for key, attempt in latest.items()
+            ],
+        )
+        self._insert_questions(
+            cur,
+            [
+                (ids[key], q.q_no, q.section, q.max_score, q.score, q.chapter, q.subtopic, q.cognitive)
+                for key, attempt in latest.items()
+                for q in attempt.by_question
+            ],
+        )
+
+        changes.extend(
+            (attempt.user_id, attempt.date_done, attempt.by_question, 1) for attempt in latest.values()
+        )
+        self.rollups.apply(cur, changes)
+        self.rollups.record(cur, ids.values())
+        return [ids[_key(attempt)] for attempt in attempts]
+
+    def _existing(self, cur: Cursor, keys) -> Dict[AttemptKey, Tuple[str, str]]:
+        """Maps the attempt keys already stored to (result_id, date_done)."""
+        # Matches (and on Postgres locks) only these attempts, not the users' other results.
+        lock = " FOR UPDATE" if cur.dialect == "postgres" else ""
+        found: Dict[AttemptKey, Tuple[str, str]] = {}
+        for chunk in _chunks(sorted(keys), size=200):
+            cur.execute(
+                "SELECT result_id, user_id, state, year, paper_no, date_done FROM tracker_results "
+                "WHERE (user_id, state, year, paper_no) IN "
+                f"(VALUES {', '.join('(?, ?, ?, ?)' for _ in chunk)}){lock}",
+                [value for key in chunk for value in key],
+            )
+            for result_id, user_id, state, year, paper_no, date_done in cur.fetchall():
+                found[(user_id, state, int(year), paper_no)] = (str(result_id), str(date_done))
+        return found
+
+    def _insert_questions(self, cur: Cursor, rows: List[tuple]) -> None:
+        columns = "result_id, q_no, section, max_score, score, chapter, subtopic, cognitive"
+        if cur.dialect == "postgres":
+            with cur.raw.copy(f"COPY tracker_result_questions ({columns}) FROM STDIN") as copy:
+                for row in rows:
+                    copy.write_row(row)
+            return
+        cur.executemany(
+            f"INSERT INTO tracker_result_questions ({columns}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+
+
+AttemptKey = Tuple[str, str, int, str]
+
+
+def _key(attempt: Attempt) -> AttemptKey:
+    return (attempt.user_id, attempt.state, int(attempt.year), attempt.paper_no)
+
+
+def _chunks(values: List, size: int = 500):
+    for start in range(0, len(values), size):
+        yield values[start : start + size]
+
+
+def _marks(values: Sequence) -> str:
+    return ", ".join("?" for _ in values)
+
+
+def _num(value) -> Optional[float]:
+    return None if value is None else float(value)
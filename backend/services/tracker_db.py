@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Sequence
+
+LOGGER = logging.getLogger(__name__)
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+MIGRATIONS_DIR = REPO_ROOT / "db" / "migrations"
+# Same variable the Next.js tracker uses. `sqlite:///relative.db`, `sqlite:////abs.db`
+# or `sqlite://` (in-memory) select the local stand-in.
+DATABASE_URL = os.getenv("DATABASE_URL", "")
+DB_POOL_SIZE = int(os.getenv("AI_MARKING_DB_POOL_SIZE", "5"))
+
+# SQLite equivalent of db/migrations/*.sql, used for local development and tests.
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracker_results (
+  result_id TEXT PRIMARY KEY,
+  user_id TEXT NOT NULL,
+  state TEXT NOT NULL,
+  year INTEGER NOT NULL,
+  paper_no TEXT NOT NULL,
+  date_done TEXT NOT NULL,
+  time_spent_min INTEGER,
+  notes TEXT,
+  total_score REAL NOT NULL,
+  total_max REAL NOT NULL,
+  created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS tracker_results_unique_attempt
+  ON tracker_results (user_id, state, year, paper_no);
+
+CREATE TABLE IF NOT EXISTS tracker_result_questions (
+  result_id TEXT REFERENCES tracker_results(result_id) ON DELETE CASCADE,
+  q_no INTEGER NOT NULL,
+  section TEXT NOT NULL,
+  max_score REAL NOT NULL,
+  score REAL,
+  chapter TEXT,
+  subtopic TEXT,
+  cognitive TEXT,
+  PRIMARY KEY (result_id, q_no)
+);
+
+CREATE TABLE IF NOT EXISTS tracker_recommendation_sets (
+  id TEXT PRIMARY KEY,
+  user_id TEXT NOT NULL,
+  week_start TEXT NOT NULL,
+  subtopics TEXT DEFAULT '[]',
+  question_ids TEXT DEFAULT '[]',
+  estimated_time_min INTEGER DEFAULT 0,
+  status TEXT NOT NULL,
+  title TEXT NOT NULL,
+  description TEXT,
+  carries_forward INTEGER DEFAULT 0,
+  created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS tracker_rollup_chapter (
+  user_id TEXT NOT NULL,
+  chapter TEXT NOT NULL,
+  score_sum REAL NOT NULL,
+  max_sum REAL NOT NULL,
+  question_count INTEGER NOT NULL,
+  PRIMARY KEY (user_id, chapter)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS tracker_rollup_cognitive (
+  user_id TEXT NOT NULL,
+  cognitive TEXT NOT NULL,
+  score_sum REAL NOT NULL,
+  max_sum REAL NOT NULL,
+  question_count INTEGER NOT NULL,
+  PRIMARY KEY (user_id, cognitive)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS tracker_rollup_subtopic_daily (
+  user_id TEXT NOT NULL,
+  chapter TEXT NOT NULL,
+  subtopic TEXT NOT NULL,
+  date_done TEXT NOT NULL,
+  score_sum REAL NOT NULL,
+  max_sum REAL NOT NULL,
+  question_count INTEGER NOT NULL,
+  PRIMARY KEY (user_id, chapter, subtopic, date_done)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS tracker_rollup_subtopic_daily_window
+  ON tracker_rollup_subtopic_daily
+  (user_id, date_done, chapter, subtopic, score_sum, max_sum, question_count);
+
+CREATE TABLE IF NOT EXISTS tracker_rollup_ledger (
+  result_id TEXT PRIMARY KEY,
+  user_id TEXT NOT NULL,
+  updated_at TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS tracker_rollup_ledger_user
+  ON tracker_rollup_ledger (user_id);
+"""
+
+
+class Cursor:
+    """
+    DB-API cursor wrapper so queries can be written once with `?` placeholders
+    and run on either SQLite or Postgres (psycopg uses `%s`).
+    """
+
+    def __init__(self, raw, dialect: str) -> None:
+        self._raw = raw
+        self.dialect = dialect
+
+    def _sql(self, sql: str) -> str:
+        return sql.replace("?", "%s") if self.dialect == "postgres" else sql
+
+    def execute(self, sql: str, params: Sequence = ()) -> "Cursor":
+        self._raw.execute(self._sql(sql), tuple(params))
+        return self
+
+    def executemany(self, sql: str, rows: Iterable[Sequence]) -> "Cursor":
+        rows = [tuple(row) for row in rows]
+        if rows:
+            self._raw.executemany(self._sql(sql), rows)
+        return self
+
+    def fetchone(self):
+        return self._raw.fetchone()
+
+    def fetchall(self):
+        return self._raw.fetchall()
+
+    @property
+    def rowcount(self) -> int:
+        return self._raw.rowcount
+
+    @property
+    def raw(self):
+        """The driver's own cursor, for dialect-specific features such as COPY."""
+        return self._raw
+
+
+class TrackerDatabase:
+    """
+    Connection factory for the tracker tables: a psycopg connection pool for
+    Postgres, or a single serialized connection for the SQLite stand-in.
+    """
+
+    def __init__(self, url: str, pool_size: int = DB_POOL_SIZE) -> None:
+        self.url = url
+        if url.startswith("sqlite://"):
+            self.dialect = "sqlite"
+            path = url[len("sqlite:///") :] if url.startswith("sqlite:///") else ""
+            path = path or ":memory:"
+            if path != ":memory:":
+                Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._sqlite = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._sqlite.execute("PRAGMA foreign_keys=ON")
+            if path != ":memory:":
+                self._sqlite.execute("PRAGMA journal_mode=WAL")
+            self._lock = threading.Lock()
+            self._pool = None
+        elif url.startswith(("postgres://", "postgresql://")):
+            self.dialect = "postgres"
+            try:
+                from psycopg_pool import ConnectionPool  # type: ignore
+            except Exception as exc:  # pragma: no cover - optional dependency
+                raise RuntimeError(
+                    "psycopg[pool] is required for Postgres. Install backend/requirements.txt."
+                ) from exc
+            self._pool = ConnectionPool(url, min_size=1, max_size=pool_size, open=True)
+        else:
+            raise ValueError(f"Unsupported DATABASE_URL scheme: {url!r}")
+
+    @classmethod
+    def from_env(cls) -> Optional["TrackerDatabase"]:
+        if not DATABASE_URL:
+            LOGGER.info("DATABASE_URL not set; tracker endpoints are disabled.")
+            return None
+        return cls(DATABASE_URL)
+
+    @contextmanager
+    def transaction(self) -> Iterator[Cursor]:
+        """Yields a cursor inside a single transaction; commits on success."""
+        if self.dialect == "sqlite":
+            with self._lock:
+                raw = self._sqlite.cursor()
+                raw.execute("BEGIN IMMEDIATE")
+                try:
+                    yield Cursor(raw, self.dialect)
+                except BaseException:
+                    raw.execute("ROLLBACK")
+                    raise
+                else:
+                    raw.execute("COMMIT")
+                finally:
+                    raw.close()
+            return
+
+        with self._pool.connection() as conn:  # commits, or rolls back on error
+            with conn.cursor() as raw:
+                yield Cursor(raw, self.dialect)
+
+    def ensure_schema(self) -> None:
+        """
+        Creates the tracker tables: SQLite schema above, or db/migrations for Postgres.
+        Postgres migrations are recorded in `schema_migrations` and only applied once,
+        so restarts don't re-lock the tables the Next.js app shares.
+        """
+        if self.dialect == "sqlite":
+            with self._lock:
+                self._sqlite.executescript(SQLITE_SCHEMA)
+            return
+
+        with self._pool.connection() as conn:  # one transaction, committed on exit
+            # Serializes backends starting at the same time without locking any table.
+            conn.execute("SELECT pg_advisory_xact_lock(hashtext('schema_migrations'))")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS schema_migrations ("
+                "name TEXT PRIMARY KEY, applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW())"
+            )
+            applied = {row[0] for row in conn.execute("SELECT name FROM schema_migrations")}
+            for migration in sorted(MIGRATIONS_DIR.glob("*.sql")):
+                if migration.name in applied:
+                    continue
+                conn.execute(migration.read_text(encoding="utf-8"))
+                conn.execute("INSERT INTO schema_migrations (name) VALUES (%s)", (migration.name,))
+                LOGGER.info("Applied migration %s.", migration.name)
+
+    def close(self) -> None:
+        if self.dialect == "sqlite":
+            self._sqlite.close()
+        elif self._pool is not None:
+            self._pool.close()
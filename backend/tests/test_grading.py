@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+from backend.services import answer_key
+from backend.services.answer_key import AnswerKeyStore
+from backend.services.grading import SympyGrader
+
+grader = SympyGrader()
+pytestmark = pytest.mark.skipif(not grader.available, reason="SymPy LaTeX parsing is unavailable")
+
+
+def test_grade_compiled_tries_alternatives_when_official_answer_failed():
+    correct, normalized, reason = grader.grade_compiled("x+1", [None, grader.compile_answer("1+x")])
+    assert correct
+    assert reason == "Matches an accepted alternative form of the answer."
+    assert normalized.answer is not None
+
+
+def test_grade_compiled_unparseable():
+    assert grader.grade_compiled("x+1", [None, None])[2] == "Unable to parse one of the expressions."
+    assert grader.grade_compiled(r"\frac{", [grader.compile_answer("x")])[2] == (
+        "Unable to parse one of the expressions."
+    )
+
+
+def test_answer_keys_that_fail_to_compile_are_not_cached(tmp_path, monkeypatch):
+    source = tmp_path / "answer-keys.json"
+    source.write_text(json.dumps({"Q1": "x+1", "Q2": r"\frac{"}), encoding="utf-8")
+    cache = tmp_path / "answer-keys.pkl"
+
+    store = AnswerKeyStore(grader, source_path=source, cache_path=cache)
+    store.load()
+    assert store.get("Q1").compiled[0] is not None
+    assert store.get("Q2").compiled == [None]
+
+    compiled = []
+    original = AnswerKeyStore._compile
+    monkeypatch.setattr(
+        AnswerKeyStore, "_compile", lambda self, payload: compiled.extend(payload) or original(self, payload)
+    )
+    AnswerKeyStore(grader, source_path=source, cache_path=cache).load()
+    assert compiled == ["Q2"]
+
+    # A different SymPy version invalidates the whole cache.
+    monkeypatch.setattr(answer_key, "_sympy_version", lambda: "0.0")
+    compiled.clear()
+    AnswerKeyStore(grader, source_path=source, cache_path=cache).load()
+    assert compiled == ["Q1", "Q2"]
@@ -0,0 +1,72 @@
+import threading
+import time
+
+from backend.services.jobs import RecognitionJobQueue
+
+
+class BlockingPipeline:
+    def __init__(self):
+        self.calls = 0
+        self.release = threading.Event()
+
+    def recognize(self, image_bytes):
+        self.calls += 1
+        self.release.wait(5)
+        return {"latex": image_bytes.decode()}
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_running_job_of_a_live_process_is_not_requeued(tmp_path):
+    first_pipeline, second_pipeline = BlockingPipeline(), BlockingPipeline()
+    first = RecognitionJobQueue(first_pipeline, db_path=tmp_path / "jobs.db", workers=1, lease=0.3)
+    second = RecognitionJobQueue(second_pipeline, db_path=tmp_path / "jobs.db", workers=1, lease=0.3)
+    first.start()
+    try:
+        job_id = first.submit(b"x+1")
+        wait_for(lambda: first_pipeline.calls == 1)
+
+        # Starting another process and outliving several leases leaves the job alone.
+        second.start()
+        time.sleep(1.0)
+        assert second.get(job_id).status == "running"
+        assert second_pipeline.calls == 0
+
+        first_pipeline.release.set()
+        wait_for(lambda: first.get(job_id).finished)
+        assert first.get(job_id).result == {"latex": "x+1"}
+        assert second_pipeline.calls == 0
+    finally:
+        first_pipeline.release.set()
+        first.stop()
+        second.stop()
+
+
+def test_job_with_expired_lease_is_requeued(tmp_path):
+    crashed = RecognitionJobQueue(BlockingPipeline(), db_path=tmp_path / "jobs.db", workers=1, lease=0.3)
+    crashed.start()
+    job_id = crashed.submit(b"y")
+    wait_for(lambda: crashed.get(job_id).status == "running")
+    # Simulate a crash: heartbeats stop while the job is still marked running.
+    crashed._stopping.set()
+    time.sleep(0.5)
+
+    pipeline = BlockingPipeline()
+    pipeline.release.set()
+    survivor = RecognitionJobQueue(pipeline, db_path=tmp_path / "jobs.db", workers=1, lease=0.3)
+    survivor.start()
+    try:
+        wait_for(lambda: survivor.get(job_id).finished)
+        assert survivor.get(job_id).result == {"latex": "y"}
+        # The crashed owner can no longer overwrite the result.
+        crashed._finish(crashed._connection(), job_id, None, "late")
+        assert survivor.get(job_id).status == "done"
+    finally:
+        crashed.pipeline.release.set()
+        survivor.stop()
+        crashed.stop()
@@ -0,0 +1,66 @@
+import asyncio
+import threading
+import time
+
+from backend.services.profiling import ProfilingMiddleware, ProfilingSettings, ProfileStore
+
+
+def serve(middleware, paths):
+    """Runs one request per path concurrently through the middleware."""
+
+    async def send(message):
+        pass
+
+    async def receive():
+        return {"type": "http.request"}
+
+    async def main():
+        await asyncio.gather(
+            *(
+                middleware({"type": "http", "method": "GET", "path": path, "headers": []}, receive, send)
+                for path in paths
+            )
+        )
+
+    asyncio.run(main())
+
+
+def test_concurrent_profiled_requests_share_one_sampler_thread(tmp_path):
+    samplers = []
+
+    async def app(scope, receive, send):
+        samplers.append(sum(t.name == "profile-sampler" for t in threading.enumerate()))
+        await asyncio.sleep(0.2)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    store = ProfileStore(tmp_path)
+    middleware = ProfilingMiddleware(app, ProfilingSettings(slow_ms=10_000, interval_ms=5), store)
+    started = time.perf_counter()
+    serve(middleware, ["/"] * 300)
+
+    assert time.perf_counter() - started < 2
+    assert max(samplers) <= 1
+    assert store.list() == []
+
+
+def test_slow_request_profile_only_contains_its_own_work(tmp_path):
+    async def app(scope, receive, send):
+        if scope["path"] == "/slow":
+            deadline = time.perf_counter() + 0.15
+            while time.perf_counter() < deadline:
+                pass
+        else:
+            for _ in range(30):
+                await asyncio.sleep(0.01)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    store = ProfileStore(tmp_path)
+    middleware = ProfilingMiddleware(app, ProfilingSettings(slow_ms=100, interval_ms=2), store)
+    serve(middleware, ["/slow", "/idle"])
+    profiles = {p["path"]: p for p in store.list()}
+    slow = store.get(profiles["/slow"]["id"])
+    assert slow["samples"] > 0
+    # The idle request was saved too (it took > 100 ms) but never ran while sampled busy.
+    assert profiles["/idle"]["samples"] < slow["samples"]
@@ -0,0 +1,236 @@
+-- Rollup tables maintained incrementally by the triggers at the end of this file
+-- whenever an attempt is inserted, upserted or deleted. Dashboards read these
+-- instead of scanning tracker_result_questions. Questions without a score are
+-- not counted.
+
+-- all-time score per user x chapter
+CREATE TABLE IF NOT EXISTS tracker_rollup_chapter (
+  user_id TEXT NOT NULL,
+  chapter TEXT NOT NULL,
+  score_sum NUMERIC NOT NULL,
+  max_sum NUMERIC NOT NULL,
+  question_count INTEGER NOT NULL,
+  PRIMARY KEY (user_id, chapter) INCLUDE (score_sum, max_sum, question_count)
+);
+
+-- all-time score per user x cognitive level
+CREATE TABLE IF NOT EXISTS tracker_rollup_cognitive (
+  user_id TEXT NOT NULL,
+  cognitive TEXT NOT NULL,
+  score_sum NUMERIC NOT NULL,
+  max_sum NUMERIC NOT NULL,
+  question_count INTEGER NOT NULL,
+  PRIMARY KEY (user_id, cognitive) INCLUDE (score_sum, max_sum, question_count)
+);
+
+-- daily buckets per user x chapter x subtopic, for "last 7/14 days" windows
+CREATE TABLE IF NOT EXISTS tracker_rollup_subtopic_daily (
+  user_id TEXT NOT NULL,
+  chapter TEXT NOT NULL,
+  subtopic TEXT NOT NULL,
+  date_done DATE NOT NULL,
+  score_sum NUMERIC NOT NULL,
+  max_sum NUMERIC NOT NULL,
+  question_count INTEGER NOT NULL,
+  PRIMARY KEY (user_id, chapter, subtopic, date_done)
+);
+
+CREATE INDEX IF NOT EXISTS tracker_rollup_subtopic_daily_window
+  ON tracker_rollup_subtopic_daily (user_id, date_done)
+  INCLUDE (chapter, subtopic, score_sum, max_sum, question_count);
+
+-- which version (updated_at) of each result the rollups reflect, so writes that
+-- bypass the rollup service can be caught up
+CREATE TABLE IF NOT EXISTS tracker_rollup_ledger (
+  result_id UUID PRIMARY KEY,
+  user_id TEXT NOT NULL,
+  updated_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS tracker_rollup_ledger_user
+  ON tracker_rollup_ledger (user_id);
+
+-- Triggers keep the rollups and the ledger current for every writer (the Next.js
+-- API as well as the Python service), so dashboards never rescan questions after
+-- a save. They are statement-level with transition tables, so a batched insert
+-- or COPY applies one grouped delta. The ledger then only flags results written
+-- while the triggers were absent or disabled (e.g. rows older than this
+-- migration), which `python -m backend.services.rollups catch-up` rebuilds.
+DO $$
+BEGIN
+  CREATE TYPE tracker_rollup_delta AS (
+    user_id TEXT,
+    chapter TEXT,
+    subtopic TEXT,
+    cognitive TEXT,
+    date_done DATE,
+    score NUMERIC,
+    max_score NUMERIC,
+    sign INTEGER
+  );
+EXCEPTION
+  WHEN duplicate_object THEN NULL;
+END
+$$;
+
+-- Adds signed question scores to all three rollups; rows whose count drops to
+-- zero are removed. Keys are upserted in order so concurrent saves lock rows
+-- consistently.
+CREATE OR REPLACE FUNCTION tracker_rollup_apply(deltas tracker_rollup_delta[])
+RETURNS void LANGUAGE plpgsql AS $$
+BEGIN
+  IF deltas IS NULL OR cardinality(deltas) = 0 THEN
+    RETURN;
+  END IF;
+
+  INSERT INTO tracker_rollup_chapter AS t (user_id, chapter, score_sum, max_sum, question_count)
+  SELECT d.user_id, d.chapter, SUM(d.sign * d.score), SUM(d.sign * d.max_score), SUM(d.sign)
+  FROM unnest(deltas) d
+  GROUP BY d.user_id, d.chapter
+  ORDER BY d.user_id, d.chapter
+  ON CONFLICT (user_id, chapter) DO UPDATE SET
+    score_sum = t.score_sum + excluded.score_sum,
+    max_sum = t.max_sum + excluded.max_sum,
+    question_count = t.question_count + excluded.question_count;
+
+  INSERT INTO tracker_rollup_cognitive AS t (user_id, cognitive, score_sum, max_sum, question_count)
+  SELECT d.user_id, d.cognitive, SUM(d.sign * d.score), SUM(d.sign * d.max_score), SUM(d.sign)
+  FROM unnest(deltas) d
+  GROUP BY d.user_id, d.cognitive
+  ORDER BY d.user_id, d.cognitive
+  ON CONFLICT (user_id, cognitive) DO UPDATE SET
+    score_sum = t.score_sum + excluded.score_sum,
+    max_sum = t.max_sum + excluded.max_sum,
+    question_count = t.question_count + excluded.question_count;
+
+  INSERT INTO tracker_rollup_subtopic_daily AS t
+    (user_id, chapter, subtopic, date_done, score_sum, max_sum, question_count)
+  SELECT d.user_id, d.chapter, d.subtopic, d.date_done,
+    SUM(d.sign * d.score), SUM(d.sign * d.max_score), SUM(d.sign)
+  FROM unnest(deltas) d
+  GROUP BY d.user_id, d.chapter, d.subtopic, d.date_done
+  ORDER BY d.user_id, d.chapter, d.subtopic, d.date_done
+  ON CONFLICT (user_id, chapter, subtopic, date_done) DO UPDATE SET
+    score_sum = t.score_sum + excluded.score_sum,
+    max_sum = t.max_sum + excluded.max_sum,
+    question_count = t.question_count + excluded.question_count;
+
+  DELETE FROM tracker_rollup_chapter t
+  USING (SELECT DISTINCT user_id FROM unnest(deltas)) u
+  WHERE t.user_id = u.user_id AND t.question_count <= 0;
+  DELETE FROM tracker_rollup_cognitive t
+  USING (SELECT DISTINCT user_id FROM unnest(deltas)) u
+  WHERE t.user_id = u.user_id AND t.question_count <= 0;
+  DELETE FROM tracker_rollup_subtopic_daily t
+  USING (SELECT DISTINCT user_id FROM unnest(deltas)) u
+  WHERE t.user_id = u.user_id AND t.question_count <= 0;
+END
+$$;
+
+-- Inserted questions count in, deleted ones are retracted (an UPDATE is both).
+-- Unscored questions are not counted, as in RollupService.rebuild_user.
+CREATE OR REPLACE FUNCTION tracker_rollup_questions_changed()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+  IF TG_OP IN ('DELETE', 'UPDATE') THEN
+    PERFORM tracker_rollup_apply(ARRAY(
+      SELECT ROW(r.user_id, COALESCE(q.chapter, ''), COALESCE(q.subtopic, ''),
+        COALESCE(q.cognitive, ''), r.date_done, q.score, q.max_score, -1)::tracker_rollup_delta
+      FROM old_rows q
+      JOIN tracker_results r ON r.result_id = q.result_id
+      WHERE q.score IS NOT NULL
+    ));
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    PERFORM tracker_rollup_apply(ARRAY(
+      SELECT ROW(r.user_id, COALESCE(q.chapter, ''), COALESCE(q.subtopic, ''),
+        COALESCE(q.cognitive, ''), r.date_done, q.score, q.max_score, 1)::tracker_rollup_delta
+      FROM new_rows q
+      JOIN tracker_results r ON r.result_id = q.result_id
+      WHERE q.score IS NOT NULL
+    ));
+  END IF;
+  RETURN NULL;
+END
+$$;
+
+-- Records each result version in the ledger and, when an attempt's date (or
+-- owner) changes, moves its existing questions to the new daily bucket.
+CREATE OR REPLACE FUNCTION tracker_rollup_results_changed()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+  IF TG_OP = 'UPDATE' THEN
+    PERFORM tracker_rollup_apply(ARRAY(
+      SELECT ROW(o.user_id, COALESCE(q.chapter, ''), COALESCE(q.subtopic, ''),
+        COALESCE(q.cognitive, ''), o.date_done, q.score, q.max_score, -1)::tracker_rollup_delta
+      FROM old_rows o
+      JOIN new_rows n ON n.result_id = o.result_id
+      JOIN tracker_result_questions q ON q.result_id = o.result_id
+      WHERE q.score IS NOT NULL
+        AND (o.user_id, o.date_done) IS DISTINCT FROM (n.user_id, n.date_done)
+      UNION ALL
+      SELECT ROW(n.user_id, COALESCE(q.chapter, ''), COALESCE(q.subtopic, ''),
+        COALESCE(q.cognitive, ''), n.date_done, q.score, q.max_score, 1)::tracker_rollup_delta
+      FROM old_rows o
+      JOIN new_rows n ON n.result_id = o.result_id
+      JOIN tracker_result_questions q ON q.result_id = n.result_id
+      WHERE q.score IS NOT NULL
+        AND (o.user_id, o.date_done) IS DISTINCT FROM (n.user_id, n.date_done)
+    ));
+  END IF;
+
+  INSERT INTO tracker_rollup_ledger (result_id, user_id, updated_at)
+  SELECT result_id, user_id, updated_at FROM new_rows
+  ORDER BY result_id
+  ON CONFLICT (result_id) DO UPDATE SET
+    user_id = excluded.user_id,
+    updated_at = excluded.updated_at;
+  RETURN NULL;
+END
+$$;
+
+-- Deleting a result cascades to its questions only after the result row is gone,
+-- when the retraction can no longer find its user and date. Remove them first.
+CREATE OR REPLACE FUNCTION tracker_rollup_result_deleted()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+  DELETE FROM tracker_result_questions WHERE result_id = OLD.result_id;
+  DELETE FROM tracker_rollup_ledger WHERE result_id = OLD.result_id;
+  RETURN OLD;
+END
+$$;
+
+DROP TRIGGER IF EXISTS tracker_rollup_questions_insert ON tracker_result_questions;
+CREATE TRIGGER tracker_rollup_questions_insert
+  AFTER INSERT ON tracker_result_questions
+  REFERENCING NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION tracker_rollup_questions_changed();
+
+DROP TRIGGER IF EXISTS tracker_rollup_questions_update ON tracker_result_questions;
+CREATE TRIGGER tracker_rollup_questions_update
+  AFTER UPDATE ON tracker_result_questions
+  REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION tracker_rollup_questions_changed();
+
+DROP TRIGGER IF EXISTS tracker_rollup_questions_delete ON tracker_result_questions;
+CREATE TRIGGER tracker_rollup_questions_delete
+  AFTER DELETE ON tracker_result_questions
+  REFERENCING OLD TABLE AS old_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION tracker_rollup_questions_changed();
+
+DROP TRIGGER IF EXISTS tracker_rollup_results_insert ON tracker_results;
+CREATE TRIGGER tracker_rollup_results_insert
+  AFTER INSERT ON tracker_results
+  REFERENCING NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION tracker_rollup_results_changed();
+
+DROP TRIGGER IF EXISTS tracker_rollup_results_update ON tracker_results;
+CREATE TRIGGER tracker_rollup_results_update
+  AFTER UPDATE ON tracker_results
+  REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION tracker_rollup_results_changed();
+
+DROP TRIGGER IF EXISTS tracker_rollup_results_delete ON tracker_results;
+CREATE TRIGGER tracker_rollup_results_delete
+  BEFORE DELETE ON tracker_results
+  FOR EACH ROW EXECUTE FUNCTION tracker_rollup_result_deleted();
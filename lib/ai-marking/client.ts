@@ -46,3 +46,17 @@ export async function gradeAnswer(
   return handleResponse<GradeResult>(response);
 }
 
+export async function gradeQuestion(
+  questionId: string,
+  studentLatex: string
+): Promise<GradeResult> {
+  const base = ensureBaseUrl();
+  const response = await fetch(`${base}/api/grade-question`, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+    },
+    body: JSON.stringify({ question_id: questionId, student_latex: studentLatex }),
+  });
+  return handleResponse<GradeResult>(response);
+}
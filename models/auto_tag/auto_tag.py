@@ -1,9 +1,10 @@
 # auto_tag.py
 # Usage:
 #   python auto_tag.py
+#   python auto_tag.py --incremental      # rescore only what changed since the last run
 #   streamlit run auto_tag.py -- --review
 
-import os, re, csv, argparse
+import os, re, csv, json, pickle, hashlib, argparse
 import cv2
 import pytesseract
 from pathlib import Path
@@ -12,6 +13,8 @@ from collections import defaultdict, Counter, deque
 import pandas as pd
 import networkx as nx
 
+from dedup import load_cluster_map
+
 # ============ Paths ============
 ROOT = Path(__file__).resolve().parents[2]
 GRAPH_DIR = ROOT / "data" / "graph"
@@ -25,6 +28,7 @@ P_QUEST = DATA_DIR / "questions.csv"
 P_OUT_DRAFT = DATA_DIR / "questions_to_skills.csv"
 P_OUT_FINAL = DATA_DIR / "questions_to_skills_final.csv"
 P_OCR_DIR = ARTIFACT_DIR / "ocr_cache"
+P_TAG_STATE = ARTIFACT_DIR / "auto_tag_state.pkl"
 
 # ============ Helpers ============
 def read_rows(path):
@@ -219,6 +223,7 @@ def infer_chapter_from_filename(stem:str):
 # ============ Pipeline ============
 def load_questions():
     rows=[]
+    clusters = load_cluster_map()
     if not P_QUEST.exists():
         print(f"[WARN] {P_QUEST} not found. Create it to supply questions.")
         return rows
@@ -234,11 +239,16 @@ def load_questions():
             cache_file = P_OCR_DIR / f"{r.question_id}.txt"
             # If text field already has content, keep it; otherwise try cache → OCR
             if not (ocr_cache_txt and ocr_cache_txt.strip()):
-                if cache_file.exists():
-                    try:
-                        ocr_cache_txt = cache_file.read_text(encoding="utf-8", errors="ignore")
-                    except Exception:
-                        ocr_cache_txt = ""
+                # Near-duplicates (see dedup.py) reuse their cluster representative's OCR
+                rep_file = P_OCR_DIR / f"{clusters.get(r.question_id, r.question_id)}.txt"
+                for f in (cache_file, rep_file):
+                    if ocr_cache_txt and ocr_cache_txt.strip():
+                        break
+                    if f.exists():
+                        try:
+                            ocr_cache_txt = f.read_text(encoding="utf-8", errors="ignore")
+                        except Exception:
+                            ocr_cache_txt = ""
                 if not (ocr_cache_txt and ocr_cache_txt.strip()) and r.image_path:
                     try:
                         ocr_text = run_ocr(Path(r.image_path))
@@ -256,14 +266,125 @@ def load_questions():
             "paper": r.paper,
             "chapter_hint": r.chapter_hint or infer_chapter_from_filename(Path(r.image_path).stem),
             "image_path": r.image_path,
-            "text": (ocr_cache_txt or "")
+            "text": (ocr_cache_txt or ""),
+            "cluster": clusters.get(r.question_id, "")
         })
     return rows
 
 def ensure_out_dir(p:Path):
     p.parent.mkdir(parents=True, exist_ok=True)
 
-def generate_candidates():
+OUT_FIELDS = [
+    "question_id","skill_id_candidate","skill_name","skill_desc","skill_chapter",
+    "score","score_chapter_prior","score_kw_overlap","kw_overlap_tokens",
+    "score_regex","regex_hits","tokens_hit",
+    "year","paper","image_path","chosen"
+]
+
+# ============ Incremental state ============
+STATE_VERSION = 1
+
+def fingerprint(*parts):
+    return hashlib.sha1(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+SCORING_FP = fingerprint(STATE_VERSION, KW_HIT, REGEX_BONUS, CHAPTER_PRIOR, REGEXES)
+
+def question_text(q):
+    return normalize((q["text"] or "") + " " + Path(q["image_path"]).stem.replace("_"," "))
+
+def question_fingerprint(q):
+    # Everything that feeds the score or is copied into the candidate row
+    return fingerprint(question_text(q), q["chapter_hint"], q["year"], q["paper"],
+                       q["image_path"], q["cluster"])
+
+def skill_fingerprint(sk, chapter_kw, G):
+    node = G.nodes.get(sk["skill_id"], {})
+    return fingerprint(sk["text"], sk["chapter"], chapter_kw.get(sk["chapter"], ""),
+                       node.get("name", ""), node.get("desc", ""))
+
+def load_tag_state():
+    if not P_TAG_STATE.exists():
+        return None
+    try:
+        with open(P_TAG_STATE, "rb") as f:
+            state = pickle.load(f)
+    except Exception:
+        return None
+    if state.get("scoring") != SCORING_FP:
+        return None
+    return state
+
+def save_tag_state(q_fps, s_fps, scores):
+    ensure_out_dir(P_TAG_STATE)
+    tmp = P_TAG_STATE.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        pickle.dump({"scoring": SCORING_FP, "questions": q_fps, "skills": s_fps, "scores": scores},
+                    f, protocol=pickle.HIGHEST_PROTOCOL)
+    tmp.replace(P_TAG_STATE)
+
+def load_chosen_flags():
+    """
+    (question_id, skill_id) → chosen flag, from the existing candidate file and
+    the review UI's export (P_OUT_FINAL), which only lists the chosen pairs.
+    """
+    flags = {}
+    if P_OUT_DRAFT.exists():
+        with open(P_OUT_DRAFT, "r", encoding="utf-8", newline="") as f:
+            for r in csv.DictReader(f):
+                flags[(r.get("question_id"), r.get("skill_id_candidate"))] = int(r.get("chosen") or 0)
+    if P_OUT_FINAL.exists():
+        with open(P_OUT_FINAL, "r", encoding="utf-8", newline="") as f:
+            for r in csv.DictReader(f):
+                flags[(r.get("question_id"), r.get("skill_id"))] = 1
+    return flags
+
+# ============ Candidates ============
+def score_skills(q, skills, chapter_kw):
+    """skill_id → (score, detail) for every skill with a positive score."""
+    qtext = question_text(q)
+    out = {}
+    for sk in skills:
+        sc, det = score_question_to_skill(qtext, q["chapter_hint"], sk, chapter_kw)
+        if sc > 0:
+            out[sk["skill_id"]] = (sc, det)
+    return out
+
+def candidate_rows(q, scores, G, skill_order, chosen):
+    rows = []
+    for sid, (sc, det) in scores.items():
+        # Read human-friendly name/desc from graph
+        node = G.nodes.get(sid, {})
+        rows.append({
+            "question_id": q["question_id"],
+            "skill_id_candidate": sid,
+            "skill_name": node.get("name", sid),  # English short name if present
+            "skill_desc": node.get("desc", ""),
+            "skill_chapter": extract_chapter_id_from_node(sid) or "",
+            "score": round(sc, 3),
+            "score_chapter_prior": round(det["chapter_prior"], 3),
+            "score_kw_overlap": round(det["kw_overlap_score"], 3),
+            "kw_overlap_tokens": det["kw_overlap"],
+            "score_regex": round(det["regex_score"], 3),
+            "regex_hits": det["regex_hits"],
+            "tokens_hit": det["tokens_hit"],
+            "year": q["year"],
+            "paper": q["paper"],
+            "image_path": q["image_path"],
+            "chosen": chosen.get((q["question_id"], sid), 0)
+        })
+    # Keep only top-5 by score for this question (ties keep graph order)
+    rows.sort(key=lambda r: (-r["score"], skill_order[r["skill_id_candidate"]]))
+    return rows[:5]
+
+def generate_candidates(incremental=False):
+    """
+    Scores questions against skills and writes the top-5 candidates per question.
+
+    With incremental=True, fingerprints of each question (normalized text, chapter
+    hint, ...) and each skill (text, chapter keywords, ...) from the previous run
+    decide which (question, skill) pairs need rescoring; all other scores come from
+    P_TAG_STATE. Reviewer `chosen` flags (see load_chosen_flags) are kept either way.
+    """
     G = build_graph()
     chapter_kw, skills = build_indexes(G)
     questions = load_questions()
@@ -272,60 +393,68 @@ def generate_candidates():
         return
 
     ensure_out_dir(P_OUT_DRAFT)
-    # We always regenerate the candidate file from scratch to avoid header drift
-    existing = set()
+    state = load_tag_state() if incremental else None
+    if incremental and state is None:
+        print("[INFO] No usable tagging state; scoring everything once.")
+    chosen = load_chosen_flags()
+    old_scores = state["scores"] if state else {}
+    old_q_fps = state["questions"] if state else {}
+    old_s_fps = state["skills"] if state else {}
+
+    q_fps = {q["question_id"]: question_fingerprint(q) for q in questions}
+    s_fps = {sk["skill_id"]: skill_fingerprint(sk, chapter_kw, G) for sk in skills}
+    skill_order = {sk["skill_id"]: i for i, sk in enumerate(skills)}
+    changed_skills = [sk for sk in skills if old_s_fps.get(sk["skill_id"]) != s_fps[sk["skill_id"]]]
+    stale_skills = {sid for sid in old_s_fps if sid not in s_fps} | {sk["skill_id"] for sk in changed_skills}
+
+    # Tag each near-duplicate cluster once (first member in file order) and copy
+    # its candidates to the other members
+    scorer = {}
+    for q in questions:
+        if q["cluster"]:
+            scorer.setdefault(q["cluster"], q["question_id"])
+
+    scores = {}
+    pairs_scored = 0
+    for q in questions:
+        qid = q["question_id"]
+        if q["cluster"] and scorer[q["cluster"]] != qid:
+            continue
+        prev = old_scores.get(qid)
+        if prev is None or old_q_fps.get(qid) != q_fps[qid]:
+            scores[qid] = score_skills(q, skills, chapter_kw)
+            pairs_scored += len(skills)
+        elif stale_skills:
+            cur = {sid: v for sid, v in prev.items() if sid not in stale_skills}
+            cur.update(score_skills(q, changed_skills, chapter_kw))
+            scores[qid] = cur
+            pairs_scored += len(changed_skills)
+        else:
+            scores[qid] = prev
 
     rows=[]
+    cluster_rows = {}
     for q in questions:
-        qtext = normalize((q["text"] or "") + " " + Path(q["image_path"]).stem.replace("_"," "))
-        # For each skill produce a score and keep top-5 per question
-        scored = []
-        for sk in skills:
-            sc, det = score_question_to_skill(qtext, q["chapter_hint"], sk, chapter_kw)
-            if sc <= 0:
-                continue
-            key = (q["question_id"], sk["skill_id"]) 
-            if key in existing:
-                continue
-            # Read human-friendly name/desc from graph
-            node = G.nodes.get(sk["skill_id"], {})
-            nm = node.get("name", sk["skill_id"])  # English short name if present
-            dsc = node.get("desc", "")
-            chap = extract_chapter_id_from_node(sk["skill_id"]) or ""
-            scored.append({
-                "question_id": q["question_id"],
-                "skill_id_candidate": sk["skill_id"],
-                "skill_name": nm,
-                "skill_desc": dsc,
-                "skill_chapter": chap,
-                "score": round(sc, 3),
-                "score_chapter_prior": round(det["chapter_prior"], 3),
-                "score_kw_overlap": round(det["kw_overlap_score"], 3),
-                "kw_overlap_tokens": det["kw_overlap"],
-                "score_regex": round(det["regex_score"], 3),
-                "regex_hits": det["regex_hits"],
-                "tokens_hit": det["tokens_hit"],
-                "year": q["year"],
-                "paper": q["paper"],
-                "image_path": q["image_path"],
-                "chosen": 0
-            })
-
-        # Keep only top-5 by score for this question
-        scored.sort(key=lambda r: r["score"], reverse=True)
-        rows.extend(scored[:5])
+        qid = q["question_id"]
+        if qid not in scores:
+            rep = cluster_rows[q["cluster"]]
+            rows.extend({**r, "question_id": qid, "year": q["year"], "paper": q["paper"],
+                         "image_path": q["image_path"],
+                         "chosen": chosen.get((qid, r["skill_id_candidate"]), 0)} for r in rep)
+            continue
+        top = candidate_rows(q, scores[qid], G, skill_order, chosen)
+        rows.extend(top)
+        if q["cluster"]:
+            cluster_rows[q["cluster"]] = top
 
     with open(P_OUT_DRAFT, "w", encoding="utf-8", newline="") as f:
-        w = csv.DictWriter(f, fieldnames=[
-            "question_id","skill_id_candidate","skill_name","skill_desc","skill_chapter",
-            "score","score_chapter_prior","score_kw_overlap","kw_overlap_tokens",
-            "score_regex","regex_hits","tokens_hit",
-            "year","paper","image_path","chosen"
-        ])
+        w = csv.DictWriter(f, fieldnames=OUT_FIELDS)
         w.writeheader()
         for r in rows:
             w.writerow(r)
 
+    save_tag_state(q_fps, s_fps, scores)
+    print(f"[INFO] Scored {pairs_scored} of {len(scores) * len(skills)} question-skill pairs")
     print(f"[DONE] Wrote candidates to: {P_OUT_DRAFT}")
 
 # ============ Review UI ============
@@ -373,7 +502,7 @@ def review_ui():
             c1.write(row.get("skill_name", row["skill_id_candidate"]))
             c2.code(row["skill_id_candidate"]) 
             c3.write(row["score"]) 
-            choose = c4.checkbox("✓", key=f"{qid}_{i}")
+            choose = c4.checkbox("✓", key=f"{qid}_{i}", value=bool(int(row["chosen"])))
             c5.write(row.get("skill_chapter", ""))
 
             with st.expander("details", expanded=False):
@@ -412,6 +541,7 @@ def main():
     ap.add_argument("--review", action="store_true", help="Launch Streamlit review UI")
     ap.add_argument("--ocr", action="store_true", help="Run OCR for questions with empty text and cache the result")
     ap.add_argument("--ocr-lang", type=str, default="eng", help="Tesseract language codes, e.g. 'eng', 'msa', or 'eng+msa'")
+    ap.add_argument("--incremental", action="store_true", help="Rescore only changed questions/skills")
     args = ap.parse_args()
     if args.ocr:
         # Pass flags via function attributes to avoid touching many signatures
@@ -420,7 +550,7 @@ def main():
     if args.review:
         review_ui()
     else:
-        generate_candidates()
+        generate_candidates(incremental=args.incremental)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,232 @@
+# dedup.py
+# Near-duplicate question detection across state papers (MinHash + LSH banding).
+# Usage:
+#   python dedup.py                 # OCR text only, report clusters
+#   python dedup.py --images        # also compare perceptual hashes of public/questions/*.png
+#   python dedup.py --images --write   # store duplicate_cluster back into data/questions.json
+
+import re, json, zlib, argparse
+from pathlib import Path
+from collections import defaultdict
+from itertools import combinations
+
+import numpy as np
+
+# ============ Paths ============
+ROOT = Path(__file__).resolve().parents[2]
+DATA_DIR = ROOT / "data"
+PUBLIC_DIR = ROOT / "public"
+P_QUESTIONS_JSON = DATA_DIR / "questions.json"
+
+CLUSTER_FIELD = "duplicate_cluster"
+
+# ============ Parameters ============
+SHINGLE_SIZE = 5        # character n-grams; robust to OCR noise and light rewording
+NUM_PERM = 128          # MinHash signature length = BANDS * ROWS
+BANDS = 32
+ROWS = 4                # LSH S-curve threshold ≈ (1/BANDS)^(1/ROWS) ≈ 0.42
+TEXT_THRESHOLD = 0.5    # estimated Jaccard needed to confirm an LSH candidate
+MIN_TEXT_CHARS = 40     # shorter OCR text is too generic to compare
+
+HASH_SIZE = 16          # dHash grid → HASH_SIZE² bits
+IMAGE_CHUNKS = 8        # multi-index hashing: 32-bit chunks, each probed within ⌊d / chunks⌋ bits
+IMAGE_MAX_DISTANCE = 20 # Hamming bits (of 256) to call two images near-identical
+WHITE_LEVEL = 245       # grey level above which scan pixels count as blank margin
+
+_PRIME = (1 << 31) - 1  # a < 2^31, x < 2^32 → a*x + b fits in uint64 without overflow
+
+
+# ============ Text → MinHash ============
+def normalize(s):
+    return re.sub(r"[^0-9a-z]+", " ", (s or "").lower()).strip()
+
+def shingles(text, k=SHINGLE_SIZE):
+    t = normalize(text)
+    if len(t) < k:
+        return np.empty(0, dtype=np.uint64)
+    grams = {t[i:i + k] for i in range(len(t) - k + 1)}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+def make_permutations(num_perm=NUM_PERM, seed=1):
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+    return a, b
+
+def minhash(shingle_hashes, perms):
+    """Signature[i] = min over shingles of (a_i * x + b_i) mod p, vectorized over all i."""
+    a, b = perms
+    return ((a[:, None] * shingle_hashes[None, :] + b[:, None]) % _PRIME).min(axis=1)
+
+# ============ LSH ============
+def lsh_candidates(signatures, bands, rows):
+    """
+    Buckets every signature band; any two items sharing a bucket become a candidate
+    pair. Cost is linear in the number of items (plus the size of each bucket).
+    """
+    pairs = set()
+    for band in range(bands):
+        buckets = defaultdict(list)
+        for idx, sig in signatures.items():
+            buckets[sig[band * rows:(band + 1) * rows].tobytes()].append(idx)
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            for i in range(len(members)):
+                for j in range(i + 1, len(members)):
+                    pairs.add((members[i], members[j]) if members[i] < members[j] else (members[j], members[i]))
+    return pairs
+
+def text_duplicates(questions, threshold=TEXT_THRESHOLD, bands=BANDS, rows=ROWS):
+    perms = make_permutations(bands * rows)
+    signatures = {}
+    for q in questions:
+        text = q.get("ocr_text") or ""
+        if len(normalize(text)) < MIN_TEXT_CHARS:
+            continue
+        signatures[q["id"]] = minhash(shingles(text), perms)
+
+    confirmed = []
+    for u, v in lsh_candidates(signatures, bands, rows):
+        similarity = float(np.mean(signatures[u] == signatures[v]))
+        if similarity >= threshold:
+            confirmed.append((u, v, similarity))
+    return confirmed, len(signatures)
+
+# ============ Images → dHash ============
+def dhash(img_path, size=HASH_SIZE):
+    from PIL import Image  # Local import so text-only runs don't need Pillow.
+
+    with Image.open(img_path) as img:
+        gray = img.convert("L")
+    # Crop blank margins first: otherwise mostly-white scans share most of their bits.
+    bbox = gray.point(lambda p: 255 if p < WHITE_LEVEL else 0).getbbox()
+    if bbox:
+        gray = gray.crop(bbox)
+    pixels = np.asarray(gray.resize((size + 1, size), Image.LANCZOS), dtype=np.int16)
+    return np.packbits((pixels[:, 1:] > pixels[:, :-1]).flatten())
+
+def mih_candidates(hashes, max_distance, chunks=IMAGE_CHUNKS):
+    """
+    Multi-index hashing: split each hash into `chunks` pieces. Two hashes within
+    `max_distance` bits must differ in at most ⌊max_distance / chunks⌋ bits in some
+    chunk (pigeonhole), so probing every chunk value within that radius finds all of
+    them while wide chunks keep buckets small. Linear in the number of items times
+    the probes per chunk.
+    """
+    ids = list(hashes)
+    bits = np.unpackbits(np.stack([hashes[i] for i in ids]), axis=1)
+    width = -(-bits.shape[1] // chunks)
+    radius = max_distance // chunks
+    pairs = set()
+    for start in range(0, bits.shape[1], width):
+        chunk = bits[:, start:start + width]
+        values = chunk.dot(1 << np.arange(chunk.shape[1], dtype=np.uint64)[::-1])
+        masks = [0] + [
+            sum(1 << b for b in flips)
+            for r in range(1, radius + 1)
+            for flips in combinations(range(chunk.shape[1]), r)
+        ]
+        table = defaultdict(list)
+        for idx, value in enumerate(values.tolist()):
+            table[value].append(idx)
+        for idx, value in enumerate(values.tolist()):
+            for mask in masks:
+                for other in table.get(value ^ mask, ()):
+                    if other > idx:
+                        pairs.add((ids[idx], ids[other]) if ids[idx] < ids[other] else (ids[other], ids[idx]))
+    return pairs
+
+def image_duplicates(questions, max_distance=IMAGE_MAX_DISTANCE, chunks=IMAGE_CHUNKS, stats=None):
+    hashes = {}
+    for q in questions:
+        rel = (q.get("question_img") or "").lstrip("/")
+        path = PUBLIC_DIR / rel
+        if rel and path.exists():
+            hashes[q["id"]] = dhash(path)
+    if not hashes:
+        return [], 0
+
+    candidates = mih_candidates(hashes, max_distance, chunks)
+    if stats is not None:
+        stats["candidates"] = len(candidates)
+    confirmed = []
+    for u, v in candidates:
+        distance = int(np.unpackbits(hashes[u] ^ hashes[v]).sum())
+        if distance <= max_distance:
+            confirmed.append((u, v, distance))
+    return confirmed, len(hashes)
+
+# ============ Clustering ============
+def cluster_pairs(pairs):
+    """Union-find over duplicate pairs; each cluster is named after its smallest ID."""
+    parent = {}
+
+    def find(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for u, v in pairs:
+        ru, rv = find(u), find(v)
+        if ru != rv:
+            parent[max(ru, rv)] = min(ru, rv)
+
+    clusters = defaultdict(list)
+    for x in parent:
+        clusters[find(x)].append(x)
+    return {root: sorted(members) for root, members in clusters.items()}
+
+def load_questions(path=P_QUESTIONS_JSON):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def write_clusters(questions, clusters, path=P_QUESTIONS_JSON):
+    assignment = {qid: root for root, members in clusters.items() for qid in members}
+    for q in questions:
+        if q["id"] in assignment:
+            q[CLUSTER_FIELD] = assignment[q["id"]]
+        else:
+            q.pop(CLUSTER_FIELD, None)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(questions, indent=2, ensure_ascii=False) + "\n")
+
+def load_cluster_map(path=P_QUESTIONS_JSON):
+    """question_id → cluster representative, for consumers such as auto_tag."""
+    if not Path(path).exists():
+        return {}
+    return {q["id"]: q[CLUSTER_FIELD] for q in load_questions(path) if q.get(CLUSTER_FIELD)}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--images", action="store_true", help="Also compare perceptual hashes of question images")
+    ap.add_argument("--threshold", type=float, default=TEXT_THRESHOLD, help="Estimated Jaccard needed for text duplicates")
+    ap.add_argument("--max-distance", type=int, default=IMAGE_MAX_DISTANCE, help="Max Hamming distance for image duplicates")
+    ap.add_argument("--write", action="store_true", help=f"Write '{CLUSTER_FIELD}' back into {P_QUESTIONS_JSON.name}")
+    args = ap.parse_args()
+
+    questions = load_questions()
+    text_pairs, n_text = text_duplicates(questions, threshold=args.threshold)
+    print(f"[INFO] Text: {n_text} questions signed, {len(text_pairs)} near-duplicate pairs")
+    pairs = [(u, v) for u, v, _ in text_pairs]
+
+    if args.images:
+        stats = {}
+        image_pairs, n_img = image_duplicates(questions, max_distance=args.max_distance, stats=stats)
+        print(f"[INFO] Images: {n_img} questions hashed, {stats.get('candidates', 0)} candidates, "
+              f"{len(image_pairs)} near-duplicate pairs")
+        pairs += [(u, v) for u, v, _ in image_pairs]
+
+    clusters = cluster_pairs(pairs)
+    for root, members in sorted(clusters.items()):
+        print(f"{root}: {', '.join(members)}")
+    print(f"[DONE] {len(clusters)} clusters covering {sum(map(len, clusters.values()))} questions")
+
+    if args.write:
+        write_clusters(questions, clusters)
+        print(f"[DONE] Wrote {CLUSTER_FIELD} to: {P_QUESTIONS_JSON}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The auto_tag scripts import each other as top-level modules (`from dedup import ...`).
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,65 @@
+import csv
+
+import pytest
+
+import auto_tag
+
+
+@pytest.fixture
+def paths(tmp_path, monkeypatch):
+    for name, filename in (
+        ("P_QUEST", "questions.csv"),
+        ("P_OUT_DRAFT", "questions_to_skills.csv"),
+        ("P_OUT_FINAL", "questions_to_skills_final.csv"),
+        ("P_TAG_STATE", "auto_tag_state.pkl"),
+    ):
+        monkeypatch.setattr(auto_tag, name, tmp_path / filename)
+    monkeypatch.setattr(auto_tag, "load_cluster_map", lambda: {"Q0005": "Q0004", "Q0010": "Q0004"})
+    return tmp_path
+
+
+def write_questions(path, edits=()):
+    skills = auto_tag.build_indexes(auto_tag.build_graph())[1]
+    chapters = sorted({sk["chapter"] for sk in skills if sk["chapter"]})
+    words = ["differentiate", "integrate", "matrix", "vector", "progression", "probability", "graph", "dy/dx"]
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["question_id", "year", "paper", "chapter_hint", "image_path", "text"])
+        for i in range(40):
+            text = " ".join(words[(i + k) % len(words)] for k in range(3))
+            if i in edits:
+                text += " solve the equation"
+            w.writerow([f"Q{i:04d}", 2020 + i % 5, f"P{1 + i % 2}", chapters[i % len(chapters)] if i % 3 else "",
+                        f"public/questions/Q{i:04d}.png", text])
+
+
+def read_draft():
+    with open(auto_tag.P_OUT_DRAFT, encoding="utf-8") as f:
+        return f.read()
+
+
+def test_incremental_run_matches_full_run_and_keeps_review_picks(paths):
+    write_questions(auto_tag.P_QUEST)
+    auto_tag.generate_candidates()
+
+    with open(auto_tag.P_OUT_DRAFT, encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f))
+    picks = {(r["question_id"], r["skill_id_candidate"]) for r in rows[::7]}
+    # The review UI exports picks without a `chosen` column.
+    with open(auto_tag.P_OUT_FINAL, "w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["question_id", "skill_id", "year", "paper", "image_path"])
+        for qid, sid in sorted(picks):
+            w.writerow([qid, sid, "", "", ""])
+
+    write_questions(auto_tag.P_QUEST, edits={1, 4, 17})
+    auto_tag.generate_candidates(incremental=True)
+    incremental = read_draft()
+
+    auto_tag.P_TAG_STATE.unlink()
+    auto_tag.generate_candidates()
+    assert read_draft() == incremental
+
+    with open(auto_tag.P_OUT_DRAFT, encoding="utf-8", newline="") as f:
+        chosen = {(r["question_id"], r["skill_id_candidate"]) for r in csv.DictReader(f) if r["chosen"] == "1"}
+    assert chosen and chosen <= picks
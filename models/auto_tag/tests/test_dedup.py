@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+import dedup
+
+
+def random_hashes(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return {f"q{i:04d}": np.packbits(rng.integers(0, 2, 256, dtype=np.uint8)) for i in range(n)}
+
+
+def flip(packed, bits):
+    unpacked = np.unpackbits(packed)
+    unpacked[bits] ^= 1
+    return np.packbits(unpacked)
+
+
+def test_mih_finds_every_pair_within_max_distance():
+    rng = np.random.default_rng(1)
+    hashes = random_hashes(2000)
+    expected = set()
+    for i, (qid, h) in enumerate(list(hashes.items())[:300]):
+        distance = i % (dedup.IMAGE_MAX_DISTANCE + 1)
+        twin = f"t{i:04d}"
+        hashes[twin] = flip(h, rng.choice(256, distance, replace=False))
+        expected.add((qid, twin))
+
+    candidates = dedup.mih_candidates(hashes, dedup.IMAGE_MAX_DISTANCE)
+    assert expected <= candidates
+    # Unrelated random hashes almost never collide: candidates stay ~linear, not quadratic.
+    assert len(candidates - expected) < 20
+
+
+def test_candidates_stay_bounded_on_question_scans():
+    paths = sorted((dedup.PUBLIC_DIR / "questions").glob("*.png"))
+    if len(paths) < 50:
+        pytest.skip("question images are not available")
+    hashes = {path.stem: dedup.dhash(path) for path in paths}
+    candidates = dedup.mih_candidates(hashes, dedup.IMAGE_MAX_DISTANCE)
+    pairs = len(hashes) * (len(hashes) - 1) // 2
+    assert len(candidates) < 0.02 * pairs
+
+
+def test_dhash_ignores_white_margins(tmp_path):
+    rng = np.random.default_rng(2)
+    content = Image.fromarray(rng.integers(0, 200, (60, 90), dtype=np.uint8))
+    padded = Image.new("L", (300, 200), 255)
+    padded.paste(content, (40, 70))
+    content.save(tmp_path / "content.png")
+    padded.save(tmp_path / "padded.png")
+
+    distance = np.unpackbits(dedup.dhash(tmp_path / "content.png") ^ dedup.dhash(tmp_path / "padded.png")).sum()
+    assert distance == 0